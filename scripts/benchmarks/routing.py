@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""
+Benchmark routing meeting topics to YouTube playlists and GDrive locations,
+like when backfilling thousands of old recordings.
+
+Usage:
+
+    uv run scripts/benchmarks/routing.py [--topics N] [--runs N]
+
+Compares the if/elif chains the upload script used to have with a compiled
+`Router`, both with its per-topic cache and without.
+"""
+
+from argparse import ArgumentParser
+import random
+import re
+import statistics
+import os.path
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from lib.constants import GDRIVE_LOCATION_PATTERNS, YOUTUBE_PLAYLIST_ROUTES  # noqa: E402
+from lib.routing import Router  # noqa: E402
+
+# Meeting series, roughly as they show up in Zoom. Real backfills are mostly
+# repeats of the same few topics.
+SERIES = (
+    'EDGI Community Standup',
+    'Website Monitoring Weekly',
+    'WM Analyst Sync',
+    'Data Together Reading Group',
+    'EDGI Community Call',
+    'EDGI Introductions',
+    'All-EDGI Meeting',
+    'AC Meeting',
+    'EEW Working Group',
+    'Coordinating Committee',
+    'Interview with a new member',
+)
+
+
+def legacy_playlist(topic: str) -> str:
+    playlist_name = ''
+    if any(x in topic.lower() for x in ['web mon', 'website monitoring', 'wm']):
+        playlist_name = 'Website Monitoring'
+
+    if 'data together' in topic.lower():
+        playlist_name = 'Data Together'
+
+    if 'community call' in topic.lower():
+        playlist_name = 'Community Calls'
+
+    if 'edgi introductions' in topic.lower():
+        playlist_name = 'EDGI Introductions'
+
+    if 'all-edgi' in topic.lower():
+        playlist_name = 'All-EDGI Meetings'
+
+    return playlist_name
+
+
+def legacy_location(topic: str) -> str:
+    if re.search(r'\bac meeting', topic, flags=re.IGNORECASE):
+        return 'ac'
+    elif re.search(r'\beew\b', topic, flags=re.IGNORECASE):
+        return 'eew'
+    elif 'all-edgi' in topic.lower():
+        return 'all_edgi'
+    else:
+        return 'default'
+
+
+def make_topics(count: int, unique_fraction: float) -> list[str]:
+    topics = []
+    for index in range(count):
+        topic = random.choice(SERIES)
+        if random.random() < unique_fraction:
+            topic = f'{topic} #{index}'
+        topics.append(topic)
+    return topics
+
+
+def time_routing(route, topics: list[str], runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for topic in topics:
+            route(topic)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: list[float], count: int) -> None:
+    median = statistics.median(timings)
+    print(f'{name:<36} {median * 1000:>9.2f} ms  ({median / count * 1_000_000:.2f} µs/topic)')
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--topics', type=int, default=5000, help='Number of topics to route.')
+    parser.add_argument('--runs', type=int, default=10, help='Number of times to run each benchmark.')
+    parser.add_argument('--unique', type=float, default=0.1,
+                        help='Fraction of topics that are one-offs rather than repeats of a series.')
+    args = parser.parse_args()
+
+    random.seed(0)
+    topics = make_topics(args.topics, args.unique)
+    playlists = Router.from_dict(YOUTUBE_PLAYLIST_ROUTES)
+    locations = Router.from_dict(GDRIVE_LOCATION_PATTERNS)
+
+    # Make sure we're comparing things that give the same answers.
+    for topic in topics:
+        assert (playlists.last(topic) or '') == legacy_playlist(topic), topic
+        assert locations.first(topic, default='default') == legacy_location(topic), topic
+
+    print(f'Median of {args.runs} runs routing {args.topics} topics ({args.unique:.0%} unique)\n')
+    report('playlists: if/elif chain', time_routing(legacy_playlist, topics, args.runs), args.topics)
+    report('playlists: Router (uncached)', time_routing(playlists._match, topics, args.runs), args.topics)
+    report('playlists: Router', time_routing(playlists.last, topics, args.runs), args.topics)
+    print()
+    report('locations: if/elif chain', time_routing(legacy_location, topics, args.runs), args.topics)
+    report('locations: Router (uncached)', time_routing(locations._match, topics, args.runs), args.topics)
+    report('locations: Router', time_routing(locations.first, topics, args.runs), args.topics)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+Benchmark how long it takes `upload_zoom_recordings.py` to start up and build
+its Google API clients.
+
+Usage:
+
+    uv run scripts/benchmarks/startup.py [--runs N]
+
+Startup times are measured in fresh Python processes, so they include the
+interpreter's own startup time (shown as the "bare interpreter" baseline).
+"""
+
+from argparse import ArgumentParser
+import os.path
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+# The modules `upload_zoom_recordings.py` used to import eagerly at startup.
+EAGER_IMPORTS = (
+    'dateutil.parser',
+    'zoomus',
+    'google.oauth2.credentials',
+    'googleapiclient.discovery',
+    'googleapiclient.http',
+    'httplib2',
+)
+
+
+def time_process(command: list[str], runs: int) -> list[float]:
+    env = dict(os.environ,
+               EDGI_ZOOM_CLIENT_ID='x',
+               EDGI_ZOOM_CLIENT_SECRET='x',
+               EDGI_ZOOM_ACCOUNT_ID='x')
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=SCRIPTS_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def time_call(fn, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    print(f'{name:<48} {statistics.median(timings) * 1000:>9.1f} ms  (min {min(timings) * 1000:.1f} ms)')
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--runs', type=int, default=10, help='Number of times to run each benchmark.')
+    args = parser.parse_args()
+
+    print(f'Median of {args.runs} runs\n')
+    report('bare interpreter', time_process([sys.executable, '-c', 'pass'], args.runs))
+    report('upload_zoom_recordings.py --help', time_process(
+        [sys.executable, 'upload_zoom_recordings.py', '--help'], args.runs))
+    report('old eager imports alone', time_process(
+        [sys.executable, '-c', f'import {", ".join(EAGER_IMPORTS)}'], args.runs))
+
+    import httplib2
+    from googleapiclient.discovery import build
+    from lib.google_api import build_client
+
+    print()
+    for api in ('drive', 'youtube'):
+        report(f'{api}: googleapiclient.discovery.build()', time_call(
+            lambda: build(api, 'v3', http=httplib2.Http()), args.runs))
+        first = time_call(lambda: build_client(api, 'v3', http=httplib2.Http()), 1)
+        report(f'{api}: build_client() first call', first)
+        report(f'{api}: build_client() later calls', time_call(
+            lambda: build_client(api, 'v3', http=httplib2.Http()), args.runs))
+
+
+if __name__ == '__main__':
+    main()
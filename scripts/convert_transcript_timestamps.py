@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 import click
-import re
 from datetime import timedelta
+from lib.transcripts import CHAT_MESSAGE
 
 OUT_TRANSCRIPT_LINE_TEMPLATE = '{ts} {author}: {msg}\n'
 IN_TRANSCRIPT_START_MARKER = 'START'
@@ -25,10 +25,9 @@ def process(input_file, output_file, context_offset, start_timestamp):
 
 def parse_transcript(input_file, context_offset):
     data = [{'raw': x.decode('utf8')} for x in input_file.readlines()]
-    line_re = re.compile(r'^(?P<timestamp>.+?)\s+(?P<author>.+?):\s+(?P<message>.+)')
 
     for i, line in enumerate(data):
-        result = re.match(line_re, line['raw'])
+        result = CHAT_MESSAGE.match(line['raw'])
         data[i].update({'ts': result.group('timestamp')})
         data[i].update({'author': result.group('author')})
         data[i].update({'msg': result.group('message')})
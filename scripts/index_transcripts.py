@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+"""
+Build and search a full-text index of the transcripts and chat logs saved
+from Zoom recordings (e.g. "2025-01-01 EDGI Community Standup (transcript).vtt"
+or "... (chat).txt" files downloaded from GDrive).
+
+Usage:
+
+    python scripts/index_transcripts.py index PATH [PATH ...]
+    python scripts/index_transcripts.py search 'wayback AND "data rescue"'
+
+The index is a SQLite database with an FTS5 full-text table, so searches use
+FTS5 query syntax (phrases, AND/OR/NOT, prefixes like `monitor*`, and
+`speaker: jane` to only search what someone said). Each result has the
+meeting, the speaker, and the time in the recording.
+
+Indexing is incremental: files that haven't changed since they were last
+indexed are skipped, and files that have been removed are dropped from the
+index. Files are parsed and added a line at a time, so big ones don't need
+to fit in memory.
+"""
+
+import hashlib
+import os
+import os.path
+import re
+import sqlite3
+import time
+from typing import Iterator
+
+import click
+
+from lib.transcripts import format_timestamp, iter_chat_entries, iter_vtt_entries
+
+
+DEFAULT_INDEX_FILE = '.transcript-index.sqlite3'
+# Matches the names `upload_zoom_recordings.py` gives these files in GDrive.
+FILE_NAME = re.compile(r'^(?P<meeting>.+?) \((?P<kind>transcript|chat)\)\.(?:vtt|txt)$', re.IGNORECASE)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    meeting TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    seconds REAL NOT NULL,
+    speaker TEXT,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_file ON entries (file_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5 (
+    speaker,
+    text,
+    content = 'entries',
+    content_rowid = 'id',
+    tokenize = 'porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts (rowid, speaker, text) VALUES (new.id, new.speaker, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, speaker, text) VALUES ('delete', old.id, old.speaker, old.text);
+END;
+'''
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def describe_file(path: str) -> tuple[str, str] | None:
+    """
+    Get the meeting name and kind ("transcript" or "chat") of a file, or
+    ``None`` if it isn't a transcript or chat log.
+    """
+    name = os.path.basename(path)
+    if match := FILE_NAME.match(name):
+        return match.group('meeting'), match.group('kind').lower()
+    elif name.lower().endswith('.vtt'):
+        return os.path.splitext(name)[0], 'transcript'
+    return None
+
+
+def find_files(paths: tuple[str, ...]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isfile(path):
+            if describe_file(path):
+                yield os.path.abspath(path)
+            continue
+        for directory, _, names in os.walk(path):
+            for name in sorted(names):
+                if describe_file(name):
+                    yield os.path.abspath(os.path.join(directory, name))
+
+
+def file_hash(path: str) -> str:
+    with open(path, 'rb') as file:
+        return hashlib.file_digest(file, 'sha256').hexdigest()
+
+
+def index_file(connection: sqlite3.Connection, path: str) -> str:
+    """
+    Add a file to the index if it's new or has changed. Returns what happened:
+    "added", "updated", or "unchanged".
+    """
+    stat = os.stat(path)
+    row = connection.execute('SELECT id, size, mtime, sha256 FROM files WHERE path = ?', (path,)).fetchone()
+    if row and row['size'] == stat.st_size and row['mtime'] == stat.st_mtime:
+        return 'unchanged'
+
+    digest = file_hash(path)
+    if row and row['sha256'] == digest:
+        # Touched, but not changed.
+        connection.execute('UPDATE files SET mtime = ? WHERE id = ?', (stat.st_mtime, row['id']))
+        return 'unchanged'
+
+    meeting, kind = describe_file(path)
+    parse = iter_vtt_entries if kind == 'transcript' else iter_chat_entries
+    connection.execute('BEGIN')
+    try:
+        if row:
+            connection.execute('DELETE FROM entries WHERE file_id = ?', (row['id'],))
+            connection.execute('DELETE FROM files WHERE id = ?', (row['id'],))
+        file_id = connection.execute(
+            'INSERT INTO files (path, meeting, kind, size, mtime, sha256, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (path, meeting, kind, stat.st_size, stat.st_mtime, digest, time.time())
+        ).lastrowid
+        with open(path, encoding='utf-8', errors='replace') as file:
+            connection.executemany(
+                'INSERT INTO entries (file_id, seconds, speaker, text) VALUES (?, ?, ?, ?)',
+                ((file_id, entry.seconds, entry.speaker, entry.text) for entry in parse(file))
+            )
+        connection.execute('COMMIT')
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+
+    return 'updated' if row else 'added'
+
+
+def remove_missing(connection: sqlite3.Connection, roots: tuple[str, ...], seen: set[str]) -> int:
+    """Drop files under ``roots`` that weren't seen from the index."""
+    roots = tuple(os.path.abspath(root) for root in roots)
+    removed = 0
+    for row in connection.execute('SELECT id, path FROM files').fetchall():
+        path = row['path']
+        under_root = any(path == root or path.startswith(os.path.join(root, '')) for root in roots)
+        if under_root and path not in seen:
+            connection.execute('BEGIN')
+            connection.execute('DELETE FROM entries WHERE file_id = ?', (row['id'],))
+            connection.execute('DELETE FROM files WHERE id = ?', (row['id'],))
+            connection.execute('COMMIT')
+            removed += 1
+    return removed
+
+
+@click.group()
+def cli():
+    """Build and search a full-text index of Zoom transcripts and chat logs."""
+
+
+@cli.command()
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--index', 'index_path', default=DEFAULT_INDEX_FILE, show_default=True,
+              help='Path to the index database.')
+def index(paths, index_path):
+    """Index new or changed transcripts and chat logs in PATHS."""
+    connection = connect(index_path)
+    start = time.perf_counter()
+    counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+    seen = set()
+    try:
+        for path in find_files(paths):
+            seen.add(path)
+            result = index_file(connection, path)
+            counts[result] += 1
+            if result != 'unchanged':
+                click.echo(f'{result.capitalize()}: {path}')
+        removed = remove_missing(connection, paths, seen)
+        if removed or counts['added'] or counts['updated']:
+            # Merge the index's segments so searches stay fast.
+            connection.execute("INSERT INTO entries_fts (entries_fts) VALUES ('optimize')")
+    finally:
+        connection.close()
+
+    click.echo(f'\nIndexed {len(seen)} files in {time.perf_counter() - start:.1f} seconds: '
+               f'{counts["added"]} added, {counts["updated"]} updated, {counts["unchanged"]} unchanged, '
+               f'{removed} removed.')
+
+
+@cli.command()
+@click.argument('query')
+@click.option('--index', 'index_path', default=DEFAULT_INDEX_FILE, show_default=True,
+              help='Path to the index database.')
+@click.option('--limit', default=20, show_default=True, help='Maximum number of results.')
+@click.option('--context-offset', default=5, show_default=True,
+              help='Seconds to move timestamps earlier, so they give some context before the match.')
+def search(query, index_path, limit, context_offset):
+    """Search the index with an FTS5 QUERY."""
+    if not os.path.exists(index_path):
+        raise click.ClickException(f'No index at "{index_path}". Run the `index` command first.')
+
+    connection = connect(index_path)
+    start = time.perf_counter()
+    try:
+        rows = connection.execute(
+            '''
+            SELECT
+                files.meeting,
+                files.kind,
+                entries.seconds,
+                entries.speaker,
+                snippet(entries_fts, 1, '[', ']', '…', 16) AS snippet
+            FROM entries_fts
+                JOIN entries ON entries.id = entries_fts.rowid
+                JOIN files ON files.id = entries.file_id
+            WHERE entries_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            ''',
+            (query, limit)
+        ).fetchall()
+    except sqlite3.OperationalError as error:
+        raise click.ClickException(f'Invalid search: {error}')
+    finally:
+        connection.close()
+    elapsed = time.perf_counter() - start
+
+    for row in rows:
+        timestamp = format_timestamp(max(0, row['seconds'] - context_offset), milliseconds=False)
+        speaker = f'{row["speaker"]}: ' if row['speaker'] else ''
+        click.echo(f'{row["meeting"]} ({row["kind"]}) {timestamp}\n    {speaker}{row["snippet"]}')
+    click.echo(f'\n{len(rows)} results in {elapsed * 1000:.1f} ms', err=True)
+
+
+if __name__ == '__main__':
+    cli()
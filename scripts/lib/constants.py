@@ -41,3 +41,25 @@ MEDIA_TYPE_FOR_EXTENSION = {
     'txt': 'text/plain',
     'vtt': 'text/vtt',
 }
+
+# Call-specific YouTube playlists, and regular expressions (matched against the
+# meeting topic, ignoring case) for the meetings that go in them. Videos are
+# added to the *last* matching playlist (as well as the default playlist).
+# These can be overridden with a `youtube-playlists.json` file.
+YOUTUBE_PLAYLIST_ROUTES = {
+    'Website Monitoring': r'web mon|website monitoring|wm',
+    'Data Together': r'data together',
+    'Community Calls': r'community call',
+    'EDGI Introductions': r'edgi introductions',
+    'All-EDGI Meetings': r'all-edgi',
+}
+
+# Regular expressions (matched against the meeting topic, ignoring case) for
+# picking a location from `gdrive-locations.json`. The *first* match wins, and
+# the "default" location is used if nothing matches. Locations in the config
+# file can set their own `pattern`; any new ones are checked after these.
+GDRIVE_LOCATION_PATTERNS = {
+    'ac': r'\bac meeting',
+    'eew': r'\beew\b',
+    'all_edgi': r'all-edgi',
+}
@@ -1,8 +1,5 @@
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.auth.exceptions import GoogleAuthError
 from os.path import basename
+from lib.google_api import DEFAULT_MAX_CONNECTIONS, ClientPool, build_client
 
 
 # This OAuth 2.0 access scope allows an application to upload files to the
@@ -20,8 +17,22 @@ FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
 
 # Create client from stored authorization credentials.
 def get_gdrive_client(credentials_path: str = DEFAULT_CREDENTIALS_FILE):
+    from google.oauth2.credentials import Credentials
+
+    credentials = Credentials.from_authorized_user_file(credentials_path)
+    return build_client(API_SERVICE_NAME, API_VERSION, credentials=credentials)
+
+
+def get_gdrive_client_pool(credentials_path: str = DEFAULT_CREDENTIALS_FILE,
+                           max_connections: int = DEFAULT_MAX_CONNECTIONS) -> ClientPool:
+    """
+    Create a pool of clients that can be used from multiple threads. Call
+    ``pool.client()`` on each thread to get a client for that thread.
+    """
+    from google.oauth2.credentials import Credentials
+
     credentials = Credentials.from_authorized_user_file(credentials_path)
-    return build(API_SERVICE_NAME, API_VERSION, credentials=credentials)
+    return ClientPool(API_SERVICE_NAME, API_VERSION, credentials, max_connections=max_connections)
 
 
 def validate_gdrive_credentials(client) -> bool:
@@ -29,6 +40,8 @@ def validate_gdrive_credentials(client) -> bool:
     Make a basic API request to validate the given credentials work. Returns a
     boolean indicating whether credentials are valid.
     """
+    from google.auth.exceptions import GoogleAuthError
+
     try:
         (
             client.files()
@@ -69,6 +82,60 @@ def ensure_folder(client, parent: str, name: str) -> str:
     return subfolder['id']
 
 
+def list_folder(client, folder_id: str) -> list[dict]:
+    """
+    List the files and folders in a folder (not including trashed ones). Each
+    item is a dict with ``id``, ``name``, ``mimeType``, ``appProperties`` (if
+    any), and ``size`` and ``md5Checksum`` (files only).
+    """
+    items = []
+    request = client.files().list(
+        q=f"'{folder_id}' in parents and trashed = false",
+        fields="nextPageToken, files(id, name, mimeType, size, md5Checksum, appProperties)",
+        pageSize=1000,
+        supportsAllDrives=True,
+        includeItemsFromAllDrives=True,
+    )
+    while request:
+        results = request.execute()
+        items.extend(results['files'])
+        request = client.files().list_next(request, results)
+    return items
+
+
+def get_files(client, file_ids: list[str], fields: str = 'id, size, md5Checksum, trashed') -> dict[str, dict | None]:
+    """
+    Get info about several files using batch requests. Returns a dict of file
+    IDs to info, where files that don't exist (or that we can't see) are
+    ``None``.
+    """
+    from googleapiclient.errors import HttpError
+
+    results = {}
+    errors = []
+
+    def callback(request_id, response, exception):
+        if exception is None:
+            results[request_id] = response
+        elif isinstance(exception, HttpError) and exception.resp.status == 404:
+            results[request_id] = None
+        else:
+            errors.append(exception)
+
+    # Drive allows up to 100 requests per batch.
+    unique_ids = list(dict.fromkeys(file_ids))
+    for start in range(0, len(unique_ids), 100):
+        batch = client.new_batch_http_request(callback=callback)
+        for file_id in unique_ids[start:start + 100]:
+            batch.add(client.files().get(fileId=file_id, fields=fields, supportsAllDrives=True),
+                      request_id=file_id)
+        batch.execute()
+
+    if errors:
+        raise errors[0]
+    return results
+
+
 def is_trashed(client, file_id: str) -> bool:
     """
     Determine if a file/folder is in the trash.
@@ -83,17 +150,23 @@ def is_trashed(client, file_id: str) -> bool:
     ).execute()['trashed']
 
 
-def upload_file(client, file: str, folder_id: str, name: str | None = None, media_type: str | None = None) -> str:
+def upload_file(client, file: str, folder_id: str, name: str | None = None, media_type: str | None = None,
+                properties: dict[str, str] | None = None) -> str:
     """
     Upload a file on disk to a folder in Google Drive. Returns the ID of the
-    created file.
+    created file. ``properties`` are saved as the file's ``appProperties``,
+    which are only visible to this app.
     """
+    from googleapiclient.http import MediaFileUpload
+
     if not name:
         name = basename(file)
     if not name:
         raise ValueError('Could not determine filename from `file` argument')
 
     file_info = {'name': name, 'parents': [folder_id]}
+    if properties:
+        file_info['appProperties'] = properties
     media = MediaFileUpload(file, mimetype=media_type, resumable=True)
 
     # TODO: improve resumability by following the suggestions around error
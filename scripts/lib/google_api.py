@@ -0,0 +1,170 @@
+"""
+Tools for building Google API clients without fetching discovery documents
+over the network.
+
+A Google API client is generated from a "discovery document" describing the
+API. Instead of letting ``googleapiclient`` decide where to get that document
+from, we look for it in this order:
+
+1. The static documents that ship with ``googleapiclient``.
+2. A document bundled with these scripts (e.g. ``youtube-api-rest.json``).
+3. A copy cached on disk from a previous network fetch.
+4. Google's discovery service (the result is cached on disk for next time).
+
+Documents are parsed once per process and shared by every client built from
+them, so building extra clients (e.g. one per thread) is cheap.
+
+Clients are not thread-safe (they use ``httplib2``, which isn't), so code
+that makes API calls from several threads should get clients from a
+``ClientPool`` instead.
+"""
+
+from functools import cache
+import json
+import os
+import os.path
+import threading
+
+
+# Maximum number of HTTP requests a client pool will make at once.
+DEFAULT_MAX_CONNECTIONS = 8
+
+
+BUNDLED_DOCUMENTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DISCOVERY_CACHE_DIR = os.environ.get(
+    'EDGI_DISCOVERY_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'edgi-scripts', 'discovery')
+)
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest'
+
+
+def _read_file(path: str) -> str | None:
+    try:
+        with open(path) as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def _fetch_document(api: str, version: str) -> str:
+    import requests
+
+    response = requests.get(DISCOVERY_URL.format(api=api, version=version), timeout=30)
+    response.raise_for_status()
+    document = response.text
+
+    cache_path = os.path.join(DISCOVERY_CACHE_DIR, f'{api}.{version}.json')
+    os.makedirs(DISCOVERY_CACHE_DIR, exist_ok=True)
+    with open(f'{cache_path}.tmp', 'w') as file:
+        file.write(document)
+    os.replace(f'{cache_path}.tmp', cache_path)
+
+    return document
+
+
+@cache
+def load_discovery_document(api: str, version: str, bundled_name: str | None = None) -> dict:
+    """
+    Get the parsed discovery document for an API. See the module docs for
+    where it might come from. ``bundled_name`` is the name of a file in this
+    directory to use if ``googleapiclient`` doesn't have the document.
+    """
+    from googleapiclient.discovery_cache import get_static_doc
+
+    document = (
+        get_static_doc(api, version)
+        or (bundled_name and _read_file(os.path.join(BUNDLED_DOCUMENTS_DIR, bundled_name)))
+        or _read_file(os.path.join(DISCOVERY_CACHE_DIR, f'{api}.{version}.json'))
+        or _fetch_document(api, version)
+    )
+    return json.loads(document)
+
+
+def build_client(api: str, version: str, credentials=None, http=None, bundled_name: str | None = None):
+    """
+    Build a client (a ``googleapiclient`` Resource) for an API from its
+    discovery document. Pass either ``credentials`` or an authorized ``http``.
+    """
+    from googleapiclient.discovery import build_from_document
+
+    document = load_discovery_document(api, version, bundled_name)
+    return build_from_document(document, credentials=credentials, http=http)
+
+
+@cache
+def _bounded_http_class():
+    import httplib2
+
+    class BoundedHttp(httplib2.Http):
+        """
+        An ``httplib2.Http`` that waits for a shared semaphore before making a
+        request, so a group of them can be limited to some number of requests
+        at once.
+        """
+
+        def __init__(self, semaphore: threading.Semaphore, **kwargs):
+            super().__init__(**kwargs)
+            self.semaphore = semaphore
+
+        def request(self, *args, **kwargs):
+            with self.semaphore:
+                return super().request(*args, **kwargs)
+
+    return BoundedHttp
+
+
+def share_credentials(credentials):
+    """
+    Make OAuth credentials safe to share between threads. If several threads
+    need to refresh an expired or rejected token at the same time, only the
+    first one actually does so.
+
+    (google-auth's non-blocking refresh can't be used here: it copies the
+    request object to refresh on another thread, which fails for our pooled
+    ``httplib2`` connections since they hold locks and sockets.)
+    """
+    lock = threading.Lock()
+    refresh = credentials.refresh
+
+    def locked_refresh(request) -> None:
+        token = credentials.token
+        with lock:
+            # Another thread refreshed the token while we were waiting.
+            if credentials.token != token and credentials.valid:
+                return
+            refresh(request)
+
+    credentials.refresh = locked_refresh
+    return credentials
+
+
+class ClientPool:
+    """
+    Hands out API clients for use on different threads. Each thread gets its
+    own client and HTTP connection, but they all share one set of
+    credentials, and no more than ``max_connections`` requests will be in
+    flight at once.
+    """
+
+    def __init__(self, api: str, version: str, credentials, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 bundled_name: str | None = None):
+        self.api = api
+        self.version = version
+        self.credentials = share_credentials(credentials)
+        self.bundled_name = bundled_name
+        self._connections = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+
+    def _create_http(self):
+        import google_auth_httplib2
+
+        http = _bounded_http_class()(self._connections)
+        return google_auth_httplib2.AuthorizedHttp(self.credentials, http=http)
+
+    def client(self):
+        """Get the client for the current thread."""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = build_client(self.api, self.version, http=self._create_http(),
+                                                       bundled_name=self.bundled_name)
+        return client
@@ -0,0 +1,395 @@
+"""
+A small, durable job queue backed by SQLite.
+
+Each job has a unique key (so producers can safely enqueue the same work over
+and over), a stage (which determines what handler runs it), and a JSON
+payload. Failed jobs are retried with exponential backoff and jitter until
+they run out of attempts, at which point they are moved to the dead-letter
+state and left alone until someone requeues them.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import StrEnum
+import json
+import random
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Callable, Iterator, Protocol
+
+
+DEFAULT_QUEUE_FILE = '.zoom-upload-queue.sqlite3'
+DEFAULT_MAX_ATTEMPTS = 5
+# Retry delays (in seconds) grow exponentially from the base up to the max.
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 60 * 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    stage TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after);
+CREATE TABLE IF NOT EXISTS job_attempts (
+    job_id INTEGER NOT NULL REFERENCES jobs (id),
+    attempt INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    outcome TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, attempt)
+);
+'''
+
+
+class JobStatus(StrEnum):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    DEAD = 'dead'
+
+
+class PermanentJobError(Exception):
+    """
+    Raise from a job handler to indicate the job can never succeed and should
+    go straight to the dead-letter state instead of being retried.
+    """
+
+
+class DeferJob(Exception):
+    """
+    Raise from a job handler to put the job off until a later time (e.g. when
+    an API quota resets) without counting it as a failed attempt.
+    """
+
+    def __init__(self, message: str, until: float):
+        super().__init__(message)
+        self.until = until
+
+
+@dataclass
+class Job:
+    id: int
+    key: str
+    stage: str
+    payload: dict
+    status: JobStatus
+    attempts: int
+    max_attempts: int
+    run_after: float
+    created_at: float
+    last_error: str | None = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> 'Job':
+        return cls(
+            id=row['id'],
+            key=row['key'],
+            stage=row['stage'],
+            payload=json.loads(row['payload']),
+            status=JobStatus(row['status']),
+            attempts=row['attempts'],
+            max_attempts=row['max_attempts'],
+            run_after=row['run_after'],
+            created_at=row['created_at'],
+            last_error=row['last_error'],
+        )
+
+
+class ClaimPolicy(Protocol):
+    """
+    Decides which ready job is claimed next. ``claim_clauses()`` is called
+    for every claim and returns an SQL condition that jobs must meet (or
+    ``None``), an ``ORDER BY`` expression, and parameters for both.
+    """
+
+    def claim_clauses(self) -> tuple[str | None, str, list]: ...
+
+
+def retry_delay(attempt: int) -> float:
+    """
+    Get the number of seconds to wait before retrying a job that has failed
+    ``attempt`` times. Uses exponential backoff with "equal jitter" so that a
+    batch of jobs that failed together don't all retry at the same moment.
+    """
+    max_delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return max_delay / 2 + random.random() * max_delay / 2
+
+
+class JobQueue:
+    """
+    A durable job queue stored in a SQLite database file. Each operation uses
+    its own short-lived connection, so a queue can be shared across threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_FILE):
+        self.path = path
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.execute('PRAGMA journal_mode = WAL')
+            yield connection
+        finally:
+            connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as connection:
+            # Take the write lock up front so claims can't race each other.
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+    def enqueue(self, key: str, stage: str, payload: dict,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS, delay: float = 0) -> bool:
+        """
+        Add a job to the queue. If a job with the same key already exists
+        (in any state), nothing happens. Returns whether the job was added.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                '''
+                INSERT INTO jobs (key, stage, payload, status, max_attempts, run_after, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO NOTHING
+                ''',
+                (key, stage, json.dumps(payload), JobStatus.PENDING, max_attempts, now + delay, now, now)
+            )
+            return cursor.rowcount > 0
+
+    def get(self, key: str) -> Job | None:
+        with self._connect() as connection:
+            row = connection.execute('SELECT * FROM jobs WHERE key = ?', (key,)).fetchone()
+            return Job.from_row(row) if row else None
+
+    def claim(self, stages: list[str] | None = None, policy: ClaimPolicy | None = None) -> Job | None:
+        """
+        Mark the next ready job as running and return it. Returns ``None`` if
+        there is no job ready to run. Jobs are claimed in the order they
+        became ready unless a ``policy`` says otherwise.
+        """
+        jobs = self.claim_many(stages, policy, limit=1)
+        return jobs[0] if jobs else None
+
+    def claim_many(self, stages: list[str] | None = None, policy: ClaimPolicy | None = None,
+                   limit: int = 1) -> list[Job]:
+        """Like ``claim()``, but claims up to ``limit`` ready jobs at once."""
+        now = time.time()
+        query = 'SELECT * FROM jobs WHERE status = ? AND run_after <= ?'
+        params = [JobStatus.PENDING, now]
+        if stages is not None:
+            query += f' AND stage IN ({", ".join("?" for _ in stages)})'
+            params.extend(stages)
+        order_by = 'run_after, id'
+        if policy:
+            condition, order_by, policy_params = policy.claim_clauses()
+            if condition:
+                query += f' AND ({condition})'
+            params.extend(policy_params)
+        query += f' ORDER BY {order_by} LIMIT ?'
+        params.append(limit)
+
+        with self._transaction() as connection:
+            jobs = [Job.from_row(row) for row in connection.execute(query, params).fetchall()]
+            for job in jobs:
+                job.attempts += 1
+                job.status = JobStatus.RUNNING
+                connection.execute(
+                    'UPDATE jobs SET status = ?, attempts = ?, updated_at = ? WHERE id = ?',
+                    (job.status, job.attempts, now, job.id)
+                )
+                connection.execute(
+                    'INSERT INTO job_attempts (job_id, attempt, started_at) VALUES (?, ?, ?)',
+                    (job.id, job.attempts, now)
+                )
+            return jobs
+
+    def save_payload(self, job: Job) -> None:
+        """
+        Persist changes to a job's payload, e.g. to record progress that should
+        not be repeated if the job is retried.
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET payload = ?, updated_at = ? WHERE id = ?',
+                (json.dumps(job.payload), time.time(), job.id)
+            )
+
+    def complete(self, job: Job) -> None:
+        self._finish(job, JobStatus.DONE, 'done')
+
+    def fail(self, job: Job, error: BaseException | str, permanent: bool = False) -> JobStatus:
+        """
+        Record a failed attempt. The job is rescheduled with backoff, or moved
+        to the dead-letter state if it is out of attempts (or ``permanent`` is
+        set). Returns the job's new status.
+        """
+        if isinstance(error, BaseException):
+            error = ''.join(traceback.format_exception_only(error)).strip()
+
+        if permanent or job.attempts >= job.max_attempts:
+            self._finish(job, JobStatus.DEAD, 'failed', error)
+        else:
+            self._finish(job, JobStatus.PENDING, 'failed', error, time.time() + retry_delay(job.attempts))
+        return job.status
+
+    def defer(self, job: Job, until: float, reason: str) -> None:
+        """
+        Put a job back in the queue to run after ``until`` (a Unix timestamp).
+        The attempt is recorded, but doesn't count toward the job's limit.
+        """
+        job.max_attempts += 1
+        self._finish(job, JobStatus.PENDING, 'deferred', reason, until)
+
+    def _finish(self, job: Job, status: JobStatus, outcome: str,
+                error: str | None = None, run_after: float | None = None) -> None:
+        now = time.time()
+        job.status = status
+        job.last_error = error
+        if run_after is not None:
+            job.run_after = run_after
+        with self._transaction() as connection:
+            connection.execute(
+                '''
+                UPDATE jobs
+                SET status = ?, payload = ?, max_attempts = ?, last_error = ?, run_after = ?, updated_at = ?
+                WHERE id = ?
+                ''',
+                (status, json.dumps(job.payload), job.max_attempts, error, job.run_after, now, job.id)
+            )
+            connection.execute(
+                'UPDATE job_attempts SET finished_at = ?, outcome = ?, error = ? WHERE job_id = ? AND attempt = ?',
+                (now, outcome, error, job.id, job.attempts)
+            )
+
+    def recover_interrupted(self) -> int:
+        """
+        Return jobs that were left running by a process that exited without
+        finishing them to the pending state. Only call this when no other
+        process is working on the queue. Returns the number of jobs recovered.
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE job_attempts SET outcome = ? WHERE outcome IS NULL AND job_id IN '
+                '(SELECT id FROM jobs WHERE status = ?)',
+                ('interrupted', JobStatus.RUNNING)
+            )
+            cursor = connection.execute(
+                'UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?',
+                (JobStatus.PENDING, time.time(), JobStatus.RUNNING)
+            )
+            return cursor.rowcount
+
+    def requeue_dead(self) -> int:
+        """Give all dead-lettered jobs a fresh set of attempts."""
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE jobs SET status = ?, attempts = 0, run_after = ?, updated_at = ? WHERE status = ?',
+                (JobStatus.PENDING, now, now, JobStatus.DEAD)
+            )
+            return cursor.rowcount
+
+    def jobs(self, status: JobStatus | None = None, since: float = 0) -> list[Job]:
+        """List jobs, optionally filtered by status and last update time."""
+        query = 'SELECT * FROM jobs WHERE updated_at >= ?'
+        params: list = [since]
+        if status:
+            query += ' AND status = ?'
+            params.append(status)
+        with self._connect() as connection:
+            return [Job.from_row(row) for row in connection.execute(query + ' ORDER BY id', params)]
+
+    def history(self, job: Job) -> list[dict]:
+        """Get the list of attempts made for a job."""
+        with self._connect() as connection:
+            return [dict(row) for row in connection.execute(
+                'SELECT attempt, started_at, finished_at, outcome, error FROM job_attempts '
+                'WHERE job_id = ? ORDER BY attempt',
+                (job.id,)
+            )]
+
+    def counts(self) -> dict[JobStatus, int]:
+        with self._connect() as connection:
+            counts = {status: 0 for status in JobStatus}
+            for row in connection.execute('SELECT status, COUNT(*) AS count FROM jobs GROUP BY status'):
+                counts[JobStatus(row['status'])] = row['count']
+            return counts
+
+
+JobHandler = Callable[[Job], None]
+
+
+def run_job(queue: JobQueue, job: Job, handler: JobHandler) -> JobStatus:
+    """Run a single claimed job and record the outcome."""
+    try:
+        handler(job)
+    except DeferJob as error:
+        print(f'  ⏸️ Job {job.key} deferred until {time.strftime("%Y-%m-%d %H:%M %Z", time.localtime(error.until))}: '
+              f'{error}')
+        queue.defer(job, error.until, str(error))
+        return JobStatus.PENDING
+    except PermanentJobError as error:
+        print(f'  ❌ Job {job.key} failed permanently: {error}')
+        return queue.fail(job, error, permanent=True)
+    except Exception as error:
+        status = queue.fail(job, error)
+        if status == JobStatus.DEAD:
+            print(f'  ❌ Job {job.key} failed after {job.attempts} attempts: {error}')
+        else:
+            print(f'  ⚠️ Job {job.key} failed (attempt {job.attempts} of {job.max_attempts}), will retry: {error}')
+        return status
+
+    queue.complete(job)
+    return JobStatus.DONE
+
+
+def run_workers(queue: JobQueue, handlers: dict[str, JobHandler], workers: int = 1,
+                stop: threading.Event | None = None, poll_interval: float = 5,
+                policy: ClaimPolicy | None = None) -> None:
+    """
+    Process jobs from the queue with a pool of worker threads.
+
+    If ``stop`` is not set, this returns as soon as there are no more jobs that
+    are ready to run (jobs scheduled for a later retry, or that ``policy``
+    won't claim, are left in the queue). Otherwise, workers keep polling for
+    new jobs until the event is set.
+    """
+    stages = list(handlers.keys())
+
+    def work() -> None:
+        while not (stop and stop.is_set()):
+            job = queue.claim(stages, policy)
+            if job:
+                run_job(queue, job, handlers[job.stage])
+            elif stop:
+                stop.wait(poll_interval)
+            else:
+                return
+
+    threads = [threading.Thread(target=work, name=f'worker-{index}') for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,418 @@
+"""
+Tools for inspecting and processing media files with ffmpeg.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from enum import StrEnum
+import json
+import os
+import os.path
+import re
+import subprocess
+import threading
+import time
+
+from lib import profiling
+
+
+# Encodes are run in a process pool, and the available cores are split
+# evenly between the encodes running at once. Each gets at least this many
+# threads, which limits how many can run at once.
+MIN_FFMPEG_THREADS = 2
+# Length of the clip used to estimate how well a video compresses.
+SAMPLE_SECONDS = 30
+# Audio quieter than this counts as silence.
+SILENCE_THRESHOLD = '-50dB'
+# Ignore silences shorter than this many seconds.
+SILENCE_MIN_DURATION = 5
+# Never trim a recording down to less than this many seconds or this fraction
+# of its length. Cutting that much almost certainly means the silence
+# detection was wrong (e.g. the whole recording is quieter than the
+# threshold), and the trimmed copy may be the only one kept.
+TRIM_MIN_KEPT_SECONDS = 60
+TRIM_MIN_KEPT_FRACTION = 0.25
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+# Number of encodes submitted to the pool that haven't finished.
+_encodes = 0
+_encodes_lock = threading.Lock()
+
+
+class ProcessingMode(StrEnum):
+    NONE = 'none'
+    REMUX = 'remux'
+    TRANSCODE = 'transcode'
+
+
+@dataclass
+class ProcessingOptions:
+    mode: ProcessingMode = ProcessingMode.NONE
+    # Constant rate factor for x264. Ignored if `video_bitrate` is set.
+    crf: int = 28
+    # Target video bitrate in bits/second, e.g. 500_000.
+    video_bitrate: int | None = None
+    preset: str = 'veryfast'
+    # Don't transcode unless it is projected to save at least this fraction
+    # of the file's size.
+    min_savings: float = 0.2
+
+
+@dataclass
+class ProcessingResult:
+    action: str
+    original_size: int
+    final_size: int
+    seconds: float
+    projected_savings: float | None = None
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - self.final_size
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class AudioAnalysis:
+    has_audio: bool
+    duration: float
+    # Silent periods as (start, end) pairs of seconds.
+    silences: list[tuple[float, float]]
+
+    def speech_bounds(self) -> tuple[float, float]:
+        """
+        Get the start and end times of the span between any silence at the
+        beginning and any silence at the end.
+        """
+        # Allow some slop, since silence detection may not start at exactly 0.
+        tolerance = 0.5
+        start, end = 0.0, self.duration
+        for silence_start, silence_end in self.silences:
+            if silence_start <= start + tolerance:
+                start = max(start, silence_end)
+            if silence_end >= self.duration - tolerance:
+                end = min(end, silence_start)
+        return start, max(start, end)
+
+
+@dataclass
+class Trim:
+    """A span of a recording that was kept, in the original's timeline."""
+    start: float
+    end: float
+
+
+def available_cores() -> int:
+    return os.process_cpu_count() or 1
+
+
+def max_encodes() -> int:
+    return max(1, available_cores() // MIN_FFMPEG_THREADS)
+
+
+def transcode_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool for running encodes."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_encodes())
+        return _pool
+
+
+def run_encode(function, *args):
+    """
+    Run an encode function in the process pool and wait for the result. The
+    last argument passed to ``function`` is the number of threads it should
+    use: an equal share of the cores between the encodes running when it is
+    submitted (so a lone encode can use them all).
+    """
+    global _encodes
+    pool = transcode_pool()
+    with _encodes_lock:
+        _encodes += 1
+        threads = max(1, available_cores() // min(_encodes, max_encodes()))
+    try:
+        with profiling.external('subprocess', 'ffmpeg (process pool)'):
+            return pool.submit(function, *args, threads).result()
+    finally:
+        with _encodes_lock:
+            _encodes -= 1
+
+
+def run_ffmpeg(args: list[str]) -> subprocess.CompletedProcess:
+    """Run ffmpeg with the given arguments, raising if it fails."""
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-nostdin', *args],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        output = result.stdout.decode('utf-8', errors='replace')[-2000:]
+        raise RuntimeError(f'ffmpeg failed with exit code {result.returncode}:\n{output}')
+    return result
+
+
+def probe(file_path: str) -> dict:
+    """Get format and stream info for a media file from ffprobe."""
+    result = subprocess.run([
+        'ffprobe',
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_format',
+        '-show_streams',
+        file_path
+    ], stdout=subprocess.PIPE, check=True)
+    return json.loads(result.stdout)
+
+
+def _parse_timestamp(timestamp: bytes) -> float:
+    hours, minutes, seconds = timestamp.split(b':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def analyze_audio(file_path: str) -> AudioAnalysis:
+    """
+    Detect whether a video file has a non-silent audio track, and find the
+    periods of silence in it.
+    """
+    result = subprocess.run([
+        'ffmpeg',
+        '-hide_banner',
+        '-nostdin',
+        '-i', file_path,
+        # Only decode audio.
+        '-vn',
+        # `silencedetect` logs the start and end of each silent period, and
+        # `ebur128=peak` looks for the peak loudness level of the audio.
+        # Docs: https://ffmpeg.org/ffmpeg-filters.html#silencedetect
+        '-af', f'silencedetect=noise={SILENCE_THRESHOLD}:d={SILENCE_MIN_DURATION},ebur128=peak=true',
+        '-f', 'null',
+        '-'
+    ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = result.stdout
+
+    duration_match = re.search(rb'Duration:\s*(\d+:\d+:[\d.]+)', output)
+    duration = _parse_timestamp(duration_match.group(1)) if duration_match else 0.0
+
+    # No audio track.
+    if not re.search(rb'Stream #\d+:\d+.*: Audio:', output) or b'audio:0kib' in output.lower():
+        return AudioAnalysis(has_audio=False, duration=duration, silences=[(0.0, duration)])
+
+    silences = []
+    silence_start = None
+    for match in re.finditer(rb'silence_(start|end): (-?[\d.]+)', output):
+        if match.group(1) == b'start':
+            silence_start = max(0.0, float(match.group(2)))
+        elif silence_start is not None:
+            silence_end = float(match.group(2))
+            silences.append((silence_start, min(duration, silence_end) if duration else silence_end))
+            silence_start = None
+    # Older versions of ffmpeg don't report the end of silence at the end.
+    if silence_start is not None:
+        silences.append((silence_start, duration))
+
+    # Silent audio. Note that this won't handle things like the low hiss of an
+    # empty room, which will report some low decibel level instead of `-inf`.
+    # In practice, this covers Zoom recordings where a mic was never turned on.
+    # Docs: https://ffmpeg.org/ffmpeg-filters.html#ebur128-1
+    has_audio = not re.search(rb'Peak:\s+-inf', output)
+
+    return AudioAnalysis(has_audio=has_audio, duration=duration, silences=silences)
+
+
+def keyframe_before(file_path: str, time: float) -> float:
+    """Find the time of the last video keyframe at or before ``time``."""
+    result = subprocess.run([
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-skip_frame', 'nokey',
+        '-show_entries', 'frame=pts_time',
+        '-of', 'csv=p=0',
+        '-read_intervals', f'{max(0.0, time - 60)}%{time}',
+        file_path
+    ], stdout=subprocess.PIPE, check=True)
+    keyframes = [float(line) for line in result.stdout.decode().split() if line.strip()]
+    return max((keyframe for keyframe in keyframes if keyframe <= time), default=0.0)
+
+
+def plan_trim(analysis: AudioAnalysis, margin: float, min_trim: float) -> Trim | None:
+    """
+    Decide what part of a recording to keep, leaving ``margin`` seconds of
+    silence on either side of the audible part. Returns ``None`` if less than
+    ``min_trim`` seconds would be removed, if no part is audible, or if the
+    trim would keep suspiciously little of the recording.
+    """
+    speech_start, speech_end = analysis.speech_bounds()
+    if speech_start >= speech_end:
+        return None
+
+    trim = Trim(start=max(0.0, speech_start - margin),
+                end=min(analysis.duration, speech_end + margin))
+    kept = trim.end - trim.start
+    if kept < min(TRIM_MIN_KEPT_SECONDS, analysis.duration) or kept < analysis.duration * TRIM_MIN_KEPT_FRACTION:
+        return None
+    if analysis.duration - kept < min_trim:
+        return None
+    return trim
+
+
+def trim_media(file_path: str, span: Trim, snap_to_keyframe: bool = True) -> tuple[str, Trim]:
+    """
+    Cut a file down to the span in ``span`` without re-encoding. Because a
+    video can only be cut cleanly at a keyframe, the start is moved back to
+    the nearest keyframe (unless ``snap_to_keyframe`` is false, e.g. for audio
+    files). Returns the new file's path and the span that was actually kept.
+    """
+    start = keyframe_before(file_path, span.start) if snap_to_keyframe and span.start > 0 else span.start
+    kept = Trim(start=start, end=span.end)
+    output_path = _output_path(file_path, 'trim')
+    run_ffmpeg([
+        '-y',
+        '-ss', str(kept.start),
+        '-to', str(kept.end),
+        '-i', file_path,
+        '-map', '0',
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        output_path
+    ])
+    return output_path, kept
+
+
+def _stream_bitrate(info: dict, codec_type: str) -> int:
+    for stream in info['streams']:
+        if stream['codec_type'] == codec_type and stream.get('bit_rate'):
+            return int(stream['bit_rate'])
+    return 0
+
+
+def _output_path(file_path: str, suffix: str) -> str:
+    base, extension = os.path.splitext(file_path)
+    return f'{base}.{suffix}{extension}'
+
+
+def remux(file_path: str) -> str:
+    """
+    Copy a video's streams into a new file with the index ("moov atom") at
+    the start, so it can start playing before it is fully downloaded.
+    """
+    output_path = _output_path(file_path, 'remux')
+    run_ffmpeg([
+        '-y',
+        '-i', file_path,
+        '-map', '0',
+        '-c', 'copy',
+        '-movflags', '+faststart',
+        output_path
+    ])
+    return output_path
+
+
+def _encoding_args(options: ProcessingOptions, threads: int) -> list[str]:
+    args = ['-c:v', 'libx264', '-preset', options.preset, '-threads', str(threads)]
+    if options.video_bitrate:
+        args += [
+            '-b:v', str(options.video_bitrate),
+            '-maxrate', str(options.video_bitrate),
+            '-bufsize', str(options.video_bitrate * 2),
+        ]
+    else:
+        args += ['-crf', str(options.crf)]
+    return args + ['-c:a', 'copy']
+
+
+def _encode_sample(file_path: str, output_path: str, start: float, options: ProcessingOptions, threads: int) -> int:
+    run_ffmpeg([
+        '-y',
+        '-ss', str(start),
+        '-t', str(SAMPLE_SECONDS),
+        '-i', file_path,
+        '-map', '0:v:0',
+        *_encoding_args(options, threads),
+        output_path
+    ])
+    return os.path.getsize(output_path)
+
+
+def _encode(file_path: str, output_path: str, options: ProcessingOptions, threads: int) -> None:
+    run_ffmpeg([
+        '-y',
+        '-i', file_path,
+        '-map', '0',
+        *_encoding_args(options, threads),
+        '-movflags', '+faststart',
+        output_path
+    ])
+
+
+def projected_savings(file_path: str, info: dict, options: ProcessingOptions) -> float:
+    """
+    Estimate what fraction of a video's size transcoding it will save. For a
+    target bitrate, this is calculated directly. For CRF encoding, a short
+    clip from the middle of the video is encoded and compared to the original.
+    """
+    duration = float(info['format'].get('duration') or 0)
+    size = int(info['format'].get('size') or os.path.getsize(file_path))
+    if not duration or not size:
+        return 0.0
+
+    audio_bitrate = _stream_bitrate(info, 'audio')
+    if options.video_bitrate:
+        projected_size = (options.video_bitrate + audio_bitrate) * duration / 8
+        return 1 - projected_size / size
+
+    video_bitrate = _stream_bitrate(info, 'video') or (size * 8 / duration - audio_bitrate)
+    sample_duration = min(SAMPLE_SECONDS, duration)
+    sample_path = _output_path(file_path, 'sample')
+    try:
+        sample_size = run_encode(_encode_sample, file_path, sample_path,
+                                 max(0.0, duration / 2 - sample_duration / 2), options)
+    finally:
+        if os.path.exists(sample_path):
+            os.remove(sample_path)
+
+    original_video_bytes = video_bitrate * sample_duration / 8
+    if original_video_bytes <= 0:
+        return 0.0
+    video_ratio = sample_size / original_video_bytes
+    video_share = video_bitrate / (video_bitrate + audio_bitrate)
+    return video_share * (1 - video_ratio)
+
+
+def process_video(file_path: str, options: ProcessingOptions) -> tuple[str, ProcessingResult]:
+    """
+    Prepare a video for upload according to ``options``. Returns the path to
+    the file to upload (which may be the original) and info about what was
+    done. Transcoding is skipped in favor of remuxing if it is not projected
+    to save at least ``options.min_savings``.
+    """
+    start = time.perf_counter()
+    original_size = os.path.getsize(file_path)
+
+    def result(action: str, final_path: str, savings: float | None = None) -> tuple[str, ProcessingResult]:
+        return final_path, ProcessingResult(
+            action=action,
+            original_size=original_size,
+            final_size=os.path.getsize(final_path),
+            seconds=time.perf_counter() - start,
+            projected_savings=savings,
+        )
+
+    if options.mode == ProcessingMode.NONE:
+        return result('none', file_path)
+
+    if options.mode == ProcessingMode.TRANSCODE:
+        info = probe(file_path)
+        savings = projected_savings(file_path, info, options)
+        if savings >= options.min_savings:
+            output_path = _output_path(file_path, 'transcode')
+            run_encode(_encode, file_path, output_path, options)
+            # Encoding can, in rare cases, make things bigger.
+            if os.path.getsize(output_path) < original_size:
+                return result('transcode', output_path, savings)
+            os.remove(output_path)
+    else:
+        savings = None
+
+    return result('remux', remux(file_path), savings)
@@ -0,0 +1,171 @@
+"""
+A local store of timing and size metrics for each run of the upload script,
+so we can tell whether things are getting slower over time.
+
+Every measurement is one row in the ``events`` table: which run and file it
+was for, the stage (e.g. "download" or "upload:gdrive"), how long it took,
+how many bytes were involved, and whether it failed. Summaries are computed
+in SQL (with window functions) rather than by looping over rows in Python.
+"""
+
+from contextlib import contextmanager
+import sqlite3
+import threading
+import time
+from typing import Iterator
+import uuid
+
+
+DEFAULT_METRICS_FILE = '.zoom-upload-metrics.sqlite3'
+PERCENTILES = (0.5, 0.95, 0.99)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    services TEXT NOT NULL,
+    errors INTEGER
+);
+CREATE TABLE IF NOT EXISTS events (
+    run_id TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    file_id TEXT,
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    error INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS events_time ON events (recorded_at);
+'''
+
+# How to group events by time period for summaries.
+PERIODS = {
+    'week': "strftime('%Y-W%W', recorded_at, 'unixepoch')",
+    'month': "strftime('%Y-%m', recorded_at, 'unixepoch')",
+    'all': "'all'",
+}
+
+
+def connect(path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=check_same_thread)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class MetricsRecorder:
+    """Records metrics for a single run of the upload script."""
+
+    def __init__(self, path: str = DEFAULT_METRICS_FILE, services: list[str] | None = None):
+        self.path = path
+        self.run_id = uuid.uuid4().hex
+        # Events may be recorded from several threads, so they share a
+        # connection guarded by a lock.
+        self._lock = threading.Lock()
+        self._connection = connect(path, check_same_thread=False)
+        self._connection.execute(
+            'INSERT INTO runs (id, started_at, services) VALUES (?, ?, ?)',
+            (self.run_id, time.time(), ','.join(services or []))
+        )
+
+    def record(self, stage: str, seconds: float, bytes: int = 0,
+               file_id: str | None = None, error: bool = False) -> None:
+        with self._lock:
+            self._connection.execute(
+                'INSERT INTO events (run_id, recorded_at, file_id, stage, seconds, bytes, error) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self.run_id, time.time(), file_id, stage, seconds, bytes, int(error))
+            )
+
+    @contextmanager
+    def measure(self, stage: str, file_id: str | None = None) -> Iterator[dict]:
+        """
+        Time the body of a ``with`` block and record it. The block can set
+        ``bytes`` on the yielded dict to record how much data it handled. If
+        the block raises, the event is recorded as an error.
+        """
+        info = {'bytes': 0}
+        start = time.perf_counter()
+        try:
+            yield info
+        except BaseException:
+            self.record(stage, time.perf_counter() - start, info['bytes'], file_id, error=True)
+            raise
+        self.record(stage, time.perf_counter() - start, info['bytes'], file_id)
+
+    def finish(self) -> None:
+        with self._lock:
+            self._connection.execute(
+                '''
+                UPDATE runs
+                SET finished_at = ?, errors = (SELECT COALESCE(SUM(error), 0) FROM events WHERE run_id = ?)
+                WHERE id = ?
+                ''',
+                (time.time(), self.run_id, self.run_id)
+            )
+            self._connection.close()
+
+
+def summarize(path: str = DEFAULT_METRICS_FILE, since: float = 0, period: str = 'week') -> list[dict]:
+    """
+    Get the count, error count, duration percentiles, and throughput for each
+    stage in each time period (see ``PERIODS``). Durations and throughput
+    only consider successful events.
+    """
+    percentile_columns = ',\n'.join(
+        f'MIN(CASE WHEN error = 0 AND rank >= {p} THEN seconds END) AS p{round(p * 100)}'
+        for p in PERCENTILES
+    )
+    query = f'''
+        WITH ranked AS (
+            SELECT
+                stage,
+                {PERIODS[period]} AS period,
+                seconds,
+                bytes,
+                error,
+                CUME_DIST() OVER (PARTITION BY stage, {PERIODS[period]}, error ORDER BY seconds) AS rank
+            FROM events
+            WHERE recorded_at >= ?
+        )
+        SELECT
+            stage,
+            period,
+            SUM(error = 0) AS count,
+            SUM(error) AS errors,
+            {percentile_columns},
+            SUM(CASE WHEN error = 0 THEN bytes END)
+                / SUM(CASE WHEN error = 0 AND bytes > 0 THEN seconds END) AS bytes_per_second
+        FROM ranked
+        GROUP BY stage, period
+        ORDER BY stage, period
+    '''
+    connection = connect(path)
+    try:
+        return [dict(row) for row in connection.execute(query, (since,))]
+    finally:
+        connection.close()
+
+
+
+def median_throughput(path: str = DEFAULT_METRICS_FILE, stage: str = 'transfer', since: float = 0) -> float | None:
+    """
+    Get the median bytes per second of successful events for a stage, or
+    ``None`` if there are no measurements to go on.
+    """
+    query = '''
+        WITH rates AS (
+            SELECT
+                bytes / seconds AS rate,
+                CUME_DIST() OVER (ORDER BY bytes / seconds) AS rank
+            FROM events
+            WHERE stage = ? AND recorded_at >= ? AND error = 0 AND bytes > 0 AND seconds > 0
+        )
+        SELECT MIN(rate) FROM rates WHERE rank >= 0.5
+    '''
+    connection = connect(path)
+    try:
+        return connection.execute(query, (stage, since)).fetchone()[0]
+    finally:
+        connection.close()
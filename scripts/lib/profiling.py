@@ -0,0 +1,201 @@
+"""
+Profiling for the upload pipeline.
+
+When a ``Profiler`` is running, it:
+
+- Profiles Python code with ``cProfile`` (for a summary of the functions that
+  took the most time).
+- Samples the stacks of all threads at a regular interval (for a flamegraph).
+- Times every subprocess (e.g. ffmpeg) and HTTP request, grouped by command or
+  by host and endpoint.
+
+Nothing is patched or recorded unless a profiler is started, so this costs
+nothing when profiling is turned off. Code that does slow external work which
+can't be detected automatically (e.g. in another process) can wrap it in
+``external()`` to have it timed.
+"""
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import cProfile
+import io
+import os
+import os.path
+import pstats
+import re
+import sys
+import threading
+import time
+from typing import Iterator
+from urllib.parse import urlsplit
+
+
+DEFAULT_SAMPLE_INTERVAL = 0.01
+DEFAULT_TOP_COUNT = 25
+# API version parts of a URL path, like "v2" in "/v2/users".
+VERSION_SEGMENT = re.compile(r'^v\d+(\.\d+)?$')
+
+# The running profiler, if any.
+_profiler: 'Profiler | None' = None
+
+
+@contextmanager
+def external(kind: str, key: str) -> Iterator[None]:
+    """Time the body of a ``with`` block as an external call, if profiling."""
+    profiler = _profiler
+    if profiler is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.record_external(kind, key, time.perf_counter() - start)
+
+
+def endpoint_name(url: str) -> str:
+    """
+    Get a name for the endpoint a URL refers to, by replacing path segments
+    that look like IDs with ``{id}``.
+    """
+    parts = urlsplit(url)
+    segments = [
+        '{id}' if not VERSION_SEGMENT.match(segment) and (re.search(r'\d|%|=', segment) or len(segment) >= 20)
+        else segment
+        for segment in parts.path.split('/')
+    ]
+    return f'{parts.hostname}{"/".join(segments)}'
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f'{module}:{code.co_qualname}'
+
+
+class Profiler:
+    def __init__(self, sample_interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.sample_interval = sample_interval
+        self.stacks: Counter[str] = Counter()
+        self.external_calls: dict[tuple[str, str], list[float]] = defaultdict(list)
+        self._external_lock = threading.Lock()
+        self._profile = cProfile.Profile()
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._unpatch: list = []
+
+    def start(self) -> None:
+        global _profiler
+        if _profiler is not None:
+            raise RuntimeError('A profiler is already running')
+        _profiler = self
+
+        self._patch_subprocess()
+        self._patch_requests()
+        self._patch_httplib2()
+        self._sampler = threading.Thread(target=self._sample, name='profiler', daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+
+    def stop(self) -> None:
+        global _profiler
+        self._profile.disable()
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        for unpatch in self._unpatch:
+            unpatch()
+        self._unpatch.clear()
+        _profiler = None
+
+    def record_external(self, kind: str, key: str, seconds: float) -> None:
+        with self._external_lock:
+            self.external_calls[(kind, key)].append(seconds)
+
+    def _patch(self, owner, name: str, kind: str, get_key) -> None:
+        original = getattr(owner, name)
+        profiler = self
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                profiler.record_external(kind, get_key(*args, **kwargs), time.perf_counter() - start)
+
+        setattr(owner, name, timed)
+        self._unpatch.append(lambda: setattr(owner, name, original))
+
+    def _patch_subprocess(self) -> None:
+        import subprocess
+
+        def command_name(args, *_, **__) -> str:
+            command = args[0] if isinstance(args, (list, tuple)) else str(args).split()[0]
+            return os.path.basename(str(command))
+
+        self._patch(subprocess, 'run', 'subprocess', command_name)
+
+    def _patch_requests(self) -> None:
+        import requests
+
+        def request_key(_session, method, url, *_, **__) -> str:
+            return f'{method.upper()} {endpoint_name(url)}'
+
+        self._patch(requests.Session, 'request', 'http', request_key)
+
+    def _patch_httplib2(self) -> None:
+        import httplib2
+
+        def request_key(_http, uri, method='GET', *_, **__) -> str:
+            return f'{method.upper()} {endpoint_name(uri)}'
+
+        self._patch(httplib2.Http, 'request', 'http', request_key)
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.sample_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, directory: str, top: int = DEFAULT_TOP_COUNT) -> tuple[str, str]:
+        """
+        Write a collapsed stack file (which tools like ``flamegraph.pl`` or
+        speedscope can read) and a text summary to ``directory``. Returns the
+        paths to the two files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        collapsed_path = os.path.join(directory, 'profile.collapsed')
+        with open(collapsed_path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+        summary_path = os.path.join(directory, 'profile-summary.txt')
+        with open(summary_path, 'w') as file:
+            file.write(self.summary(top))
+
+        return collapsed_path, summary_path
+
+    def summary(self, top: int = DEFAULT_TOP_COUNT) -> str:
+        output = io.StringIO()
+
+        output.write(f'Top {top} external calls by total time\n\n')
+        output.write(f'{"total (s)":>10} {"count":>6} {"mean (s)":>9} {"max (s)":>8}  call\n')
+        with self._external_lock:
+            calls = sorted(self.external_calls.items(), key=lambda item: sum(item[1]), reverse=True)
+        for (kind, key), timings in calls[:top]:
+            output.write(f'{sum(timings):>10.2f} {len(timings):>6} {sum(timings) / len(timings):>9.3f} '
+                         f'{max(timings):>8.2f}  {kind}: {key}\n')
+
+        output.write(f'\nTop {top} Python functions by own time\n\n')
+        stats = pstats.Stats(self._profile, stream=output)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+        return output.getvalue()
@@ -0,0 +1,58 @@
+"""
+Route meetings to destinations (playlists, folders, etc.) based on their
+topics.
+
+A ``Router`` compiles each route's pattern once, up front, and caches the
+routes that match each topic, since the same topics come up over and over
+(e.g. for every file in a meeting, or for every meeting in a weekly series
+when backfilling).
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+import re
+from typing import Iterable
+
+
+CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str
+    # A regular expression that is searched for in the topic, ignoring case.
+    pattern: str
+
+
+class Router:
+    def __init__(self, routes: Iterable[Route]):
+        self.routes = tuple(routes)
+        self._expressions = []
+        for route in self.routes:
+            try:
+                self._expressions.append(re.compile(route.pattern, re.IGNORECASE))
+            except re.error as error:
+                raise ValueError(f'Invalid pattern for route "{route.name}": {error}') from error
+
+        self._cached_match = lru_cache(maxsize=CACHE_SIZE)(self._match)
+
+    @classmethod
+    def from_dict(cls, patterns: dict[str, str]) -> 'Router':
+        """Create a router from a dict of route names to patterns (in order)."""
+        return cls(Route(name, pattern) for name, pattern in patterns.items())
+
+    def _match(self, topic: str) -> tuple[str, ...]:
+        return tuple(route.name for route, expression in zip(self.routes, self._expressions)
+                     if expression.search(topic))
+
+    def match(self, topic: str) -> tuple[str, ...]:
+        """Get the names of all the routes that match a topic, in order."""
+        return self._cached_match(topic)
+
+    def first(self, topic: str, default: str | None = None) -> str | None:
+        matches = self.match(topic)
+        return matches[0] if matches else default
+
+    def last(self, topic: str, default: str | None = None) -> str | None:
+        matches = self.match(topic)
+        return matches[-1] if matches else default
@@ -0,0 +1,81 @@
+"""
+Decide which jobs to work on, and in what order, so a run makes the most of
+the time it has.
+
+Each job's cost is estimated from the size of the file it transfers and the
+throughput measured in past runs. Under the "shortest" policy, cheap jobs go
+first (so one huge recording can't hold up a dozen small ones), but jobs get
+a bit cheaper for every hour they wait so big ones are never put off forever.
+Under the "oldest" policy, jobs are worked on in the order they were queued.
+
+If there is a deadline (e.g. because CI will kill the run), jobs that are not
+expected to finish before it are left in the queue for the next run.
+"""
+
+from dataclasses import dataclass
+from enum import StrEnum
+import time
+
+from lib.jobqueue import Job, JobQueue, JobStatus
+
+
+# Used when there are no past measurements to estimate throughput from.
+DEFAULT_THROUGHPUT = 2 * 1024 * 1024
+# Throughput varies a lot, so pad estimates to avoid starting work that will
+# be cut off.
+ESTIMATE_MARGIN = 1.5
+# Under the "shortest" policy, each hour a job waits takes this many seconds
+# off its estimated cost when deciding what to run next.
+AGING_SECONDS_PER_HOUR = 120
+
+# The estimated seconds a job will take, in SQL. Jobs without a file (e.g.
+# deleting recordings) are treated as free.
+ESTIMATE_SQL = "COALESCE(json_extract(payload, '$.file.file_size'), 0) * ? / ?"
+
+
+class SchedulePolicy(StrEnum):
+    SHORTEST = 'shortest'
+    OLDEST = 'oldest'
+
+
+@dataclass
+class Scheduler:
+    """
+    A ``ClaimPolicy`` for ``JobQueue`` that orders jobs by ``policy`` and
+    refuses jobs that won't finish before ``deadline`` (a Unix timestamp).
+    """
+    policy: SchedulePolicy = SchedulePolicy.SHORTEST
+    # Bytes per second.
+    throughput: float = DEFAULT_THROUGHPUT
+    deadline: float | None = None
+
+    def estimate(self, job: Job) -> float:
+        """Estimate how many seconds a job will take."""
+        return job.payload.get('file', {}).get('file_size', 0) * ESTIMATE_MARGIN / self.throughput
+
+    def time_left(self) -> float | None:
+        return self.deadline - time.time() if self.deadline is not None else None
+
+    def claim_clauses(self) -> tuple[str | None, str, list]:
+        condition = None
+        params = []
+        if self.deadline is not None:
+            condition = f'{ESTIMATE_SQL} <= ?'
+            params.extend([ESTIMATE_MARGIN, self.throughput, self.time_left()])
+
+        if self.policy == SchedulePolicy.SHORTEST:
+            order_by = f'{ESTIMATE_SQL} - (? - created_at) * ? / 3600, id'
+            params.extend([ESTIMATE_MARGIN, self.throughput, time.time(), AGING_SECONDS_PER_HOUR])
+        else:
+            order_by = 'created_at, id'
+
+        return condition, order_by, params
+
+    def over_deadline(self, queue: JobQueue) -> list[Job]:
+        """List jobs that are ready to run, but won't fit before the deadline."""
+        time_left = self.time_left()
+        if time_left is None:
+            return []
+        now = time.time()
+        return [job for job in queue.jobs(JobStatus.PENDING)
+                if job.run_after <= now and self.estimate(job) > time_left]
@@ -0,0 +1,159 @@
+"""
+Tools for working with the transcript (WebVTT) and chat log (text) files that
+Zoom saves alongside cloud recordings.
+
+Timestamps in both kinds of files are relative to the start of the recording,
+so they need to be shifted if the recording is trimmed.
+"""
+
+from dataclasses import dataclass
+from itertools import chain
+import re
+from typing import Iterable, Iterator
+
+
+VTT_CUE_TIMING = re.compile(r'^(\d+:\d\d:\d\d\.\d{3}) --> (\d+:\d\d:\d\d\.\d{3})(.*)$')
+CHAT_LINE = re.compile(r'^(\d+:\d\d:\d\d)(\s.*)$')
+# A message in a chat log, e.g. "00:12:34\tJane Doe:\tHello!"
+CHAT_MESSAGE = re.compile(r'^(?P<timestamp>.+?)\s+(?P<author>.+?):\s+(?P<message>.+)')
+# Newer chat logs name the recipient, e.g. "From Jane Doe to Everyone".
+CHAT_AUTHOR_RECIPIENT = re.compile(r'^From (?P<author>.+?)(?: to .+)?$')
+# Zoom starts the text of each transcript cue with the speaker's name.
+VTT_SPEAKER = re.compile(r'^(?P<speaker>[^:\n]{1,100}):\s+(?P<text>.*)$', re.DOTALL)
+
+
+@dataclass
+class TranscriptEntry:
+    """A single cue in a transcript or message in a chat log."""
+    # Time from the start of the recording.
+    seconds: float
+    speaker: str | None
+    text: str
+
+
+def parse_timestamp(timestamp: str) -> float:
+    """Parse an ``HH:MM:SS`` or ``HH:MM:SS.mmm`` timestamp into seconds."""
+    hours, minutes, seconds = timestamp.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def format_timestamp(seconds: float, milliseconds: bool = True) -> str:
+    whole_milliseconds = round(seconds * 1000)
+    hours, remainder = divmod(whole_milliseconds, 3_600_000)
+    minutes, remainder = divmod(remainder, 60_000)
+    whole_seconds, remainder = divmod(remainder, 1000)
+    if milliseconds:
+        return f'{hours:02}:{minutes:02}:{whole_seconds:02}.{remainder:03}'
+    return f'{hours:02}:{minutes:02}:{whole_seconds:02}'
+
+
+def _clamp(value: float, low: float, high: float | None) -> float:
+    value = max(low, value)
+    return min(value, high) if high is not None else value
+
+
+def retime_vtt(text: str, offset: float, duration: float | None = None) -> str:
+    """
+    Shift every cue in a WebVTT file ``offset`` seconds earlier. Cues that end
+    before the new start are dropped, and cues that run past ``duration``
+    (the new length of the recording) are cut short.
+    """
+    blocks = re.split(r'\n{2,}', text.replace('\r\n', '\n').strip('\n'))
+    output = []
+    for block in blocks:
+        lines = block.split('\n')
+        timing_index = next((i for i, line in enumerate(lines) if VTT_CUE_TIMING.match(line)), None)
+        if timing_index is None:
+            # The header, a note, or a style block.
+            output.append(block)
+            continue
+
+        timing = VTT_CUE_TIMING.match(lines[timing_index])
+        start = _clamp(parse_timestamp(timing.group(1)) - offset, 0, duration)
+        end = _clamp(parse_timestamp(timing.group(2)) - offset, 0, duration)
+        if end <= start:
+            continue
+
+        lines[timing_index] = f'{format_timestamp(start)} --> {format_timestamp(end)}{timing.group(3)}'
+        output.append('\n'.join(lines))
+
+    return '\n\n'.join(output) + '\n'
+
+
+def retime_chat(text: str, offset: float, duration: float | None = None) -> str:
+    """
+    Shift the timestamp of every message in a Zoom chat log ``offset``
+    seconds earlier. No messages are dropped: messages from before the new
+    start or after the new end are moved to the start or end.
+    """
+    output = []
+    for line in text.splitlines(keepends=True):
+        match = CHAT_LINE.match(line)
+        if match:
+            time = _clamp(parse_timestamp(match.group(1)) - offset, 0, duration)
+            line = format_timestamp(time, milliseconds=False) + match.group(2) + line[match.end():]
+        output.append(line)
+    return ''.join(output)
+
+
+def iter_vtt_entries(lines: Iterable[str]) -> Iterator[TranscriptEntry]:
+    """Parse the cues in a WebVTT transcript, one line at a time."""
+    start = None
+    text = []
+    # A blank line at the end finishes the last cue.
+    for line in chain(lines, ['']):
+        line = line.rstrip('\r\n')
+        if timing := VTT_CUE_TIMING.match(line):
+            start = parse_timestamp(timing.group(1))
+            text = []
+        elif start is not None and line.strip():
+            text.append(line.strip())
+        elif start is not None:
+            cue = ' '.join(text)
+            if match := VTT_SPEAKER.match(cue):
+                yield TranscriptEntry(start, match.group('speaker'), match.group('text'))
+            elif cue:
+                yield TranscriptEntry(start, None, cue)
+            start = None
+
+
+def iter_chat_entries(lines: Iterable[str]) -> Iterator[TranscriptEntry]:
+    """
+    Parse the messages in a Zoom chat log, one line at a time. Lines that
+    don't start with a timestamp are treated as part of the message before.
+    """
+    entry = None
+    for line in chain(lines, [None]):
+        if line is not None and not CHAT_LINE.match(line):
+            if entry and line.strip():
+                entry.text = f'{entry.text}\n{line.strip()}'.strip()
+            continue
+
+        if entry and entry.text:
+            yield entry
+        if line is None:
+            break
+
+        timestamp, rest = CHAT_LINE.match(line).groups()
+        if message := CHAT_MESSAGE.match(line):
+            author, text = message.group('author'), message.group('message').strip()
+        else:
+            # The message is on the following lines.
+            author, text = rest.strip().rstrip(':'), ''
+        if recipient := CHAT_AUTHOR_RECIPIENT.match(author):
+            author = recipient.group('author')
+        entry = TranscriptEntry(parse_timestamp(timestamp), author, text)
+
+
+def retime_file(file_path: str, offset: float, duration: float | None = None) -> None:
+    """Retime a transcript (``.vtt``) or chat log (``.txt``) file in place."""
+    with open(file_path, encoding='utf-8') as file:
+        text = file.read()
+
+    if file_path.lower().endswith('.vtt'):
+        text = retime_vtt(text, offset, duration)
+    else:
+        text = retime_chat(text, offset, duration)
+
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write(text)
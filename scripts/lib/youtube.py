@@ -1,35 +1,23 @@
 #!/usr/bin/python
 
-import argparse
+from datetime import datetime, time as datetime_time, timedelta
+from functools import cache
 import http.client as httplib
-import httplib2
-import os
 import random
+import sqlite3
+import threading
 import time
 import json
 import locale
 import sys
+from zoneinfo import ZoneInfo
 
-import google.oauth2.credentials
-from googleapiclient.discovery import build, build_from_document
-from googleapiclient.errors import HttpError, UnknownApiNameOrVersion
-from googleapiclient.http import MediaFileUpload
-from google.auth.exceptions import GoogleAuthError
+from lib.google_api import DEFAULT_MAX_CONNECTIONS, ClientPool, build_client
 
 
-# Explicitly tell the underlying HTTP transport library not to retry, since
-# we are handling retry logic ourselves.
-httplib2.RETRIES = 1
-
 # Maximum number of times to retry before giving up.
 MAX_RETRIES = 10
 
-# Always retry when these exceptions are raised.
-RETRIABLE_EXCEPTIONS = (httplib2.HttpLib2Error, IOError, httplib.NotConnected,
-  httplib.IncompleteRead, httplib.ImproperConnectionState,
-  httplib.CannotSendRequest, httplib.CannotSendHeader,
-  httplib.ResponseNotReady, httplib.BadStatusLine)
-
 # Always retry when an apiclient.errors.HttpError with one of these status
 # codes is raised.
 RETRIABLE_STATUS_CODES = [500, 502, 503, 504]
@@ -43,6 +31,34 @@ API_VERSION = 'v3'
 
 VALID_PRIVACY_STATUSES = ('public', 'private', 'unlisted')
 
+# The YouTube Data API charges each call against a daily quota. Most calls
+# are cheap, but uploads are very expensive. See:
+# https://developers.google.com/youtube/v3/determine_quota_cost
+QUOTA_COSTS = {
+    'videos.insert': 1600,
+    'videos.list': 1,
+    'channels.list': 1,
+    'playlists.list': 1,
+    'playlistItems.list': 1,
+    'playlists.insert': 50,
+    'playlistItems.insert': 50,
+}
+DEFAULT_DAILY_QUOTA = 10_000
+# The quota resets at midnight Pacific time.
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+# The Google client libraries are slow to import, so they are loaded only
+# when they are actually needed.
+@cache
+def retriable_exceptions():
+    """Get the exception types that should always be retried."""
+    import httplib2
+
+    return (httplib2.HttpLib2Error, IOError, httplib.NotConnected,
+      httplib.IncompleteRead, httplib.ImproperConnectionState,
+      httplib.CannotSendRequest, httplib.CannotSendHeader,
+      httplib.ResponseNotReady, httplib.BadStatusLine)
+
 def debug(obj, fd=sys.stderr):
     """Write obj to standard error."""
     print(obj, file=fd)
@@ -72,30 +88,202 @@ def parse_youtube_http_error(error):
     except (ValueError, KeyError, TypeError):
         return None
 
+def is_quota_exceeded(error) -> bool:
+    """Check whether an ``HttpError`` was caused by running out of quota."""
+    parsed = parse_youtube_http_error(error)
+    return bool(parsed) and any(error['reason'] in ('quotaExceeded', 'dailyLimitExceeded')
+                                for error in parsed['errors'])
+
+
+class QuotaReservation:
+    """
+    Units of quota set aside for a unit of work (e.g. uploading a meeting's
+    videos). Spending against a reservation draws it down, so the units are
+    not counted twice when admitting other work.
+    """
+
+    def __init__(self, meter: 'QuotaMeter', key: str, units: int):
+        self.meter = meter
+        self.key = key
+        self.units = units
+
+    def spend(self, method: str) -> None:
+        self.meter.spend(method, reservation=self)
+
+
+class QuotaMeter:
+    """
+    Tracks how much of the day's YouTube API quota has been used. Usage is
+    stored in a SQLite database (the job queue's) so that it carries over
+    between runs on the same day.
+
+    Before starting work that makes several API calls, ``admit()`` it with the
+    projected cost. Work that doesn't fit in what is left of the day's quota
+    should wait for ``next_reset()`` instead of failing partway through.
+    """
+
+    def __init__(self, path: str, daily_limit: int = DEFAULT_DAILY_QUOTA):
+        self.path = path
+        self.daily_limit = daily_limit
+        self._lock = threading.Lock()
+        self._reservations: dict[str, QuotaReservation] = {}
+        self._reserved_day = self.day()
+        connection = self._connect()
+        try:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS youtube_quota (
+                    day TEXT PRIMARY KEY,
+                    units INTEGER NOT NULL
+                )
+            ''')
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def day() -> str:
+        return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+    @staticmethod
+    def next_reset() -> float:
+        """Get the time the quota next resets as a Unix timestamp."""
+        tomorrow = datetime.now(QUOTA_TIMEZONE).date() + timedelta(days=1)
+        return datetime.combine(tomorrow, datetime_time(), tzinfo=QUOTA_TIMEZONE).timestamp()
+
+    def used(self) -> int:
+        connection = self._connect()
+        try:
+            row = connection.execute('SELECT units FROM youtube_quota WHERE day = ?', (self.day(),)).fetchone()
+            return row[0] if row else 0
+        finally:
+            connection.close()
+
+    def _add(self, units: int) -> None:
+        connection = self._connect()
+        try:
+            connection.execute(
+                '''
+                INSERT INTO youtube_quota (day, units) VALUES (?, ?)
+                ON CONFLICT (day) DO UPDATE SET units = units + excluded.units
+                ''',
+                (self.day(), units)
+            )
+        finally:
+            connection.close()
+
+    def spend(self, method: str, reservation: QuotaReservation | None = None) -> None:
+        """Record an API call (e.g. ``'videos.insert'``)."""
+        cost = QUOTA_COSTS[method]
+        self._add(cost)
+        if reservation:
+            with self._lock:
+                reservation.units = max(0, reservation.units - cost)
+
+    def exhaust(self) -> None:
+        """
+        Record that the API says the quota has run out (e.g. because something
+        else used it), so no more work is admitted today.
+        """
+        self._add(max(0, self.daily_limit - self.used()))
+
+    def remaining(self) -> int:
+        with self._lock:
+            return self._remaining()
+
+    def _remaining(self) -> int:
+        if self._reserved_day != self.day():
+            self._reservations.clear()
+            self._reserved_day = self.day()
+        reserved = sum(reservation.units for reservation in self._reservations.values())
+        return self.daily_limit - self.used() - reserved
+
+    def release(self, key: str, keep: int = 0) -> None:
+        """
+        Shrink the reservation for ``key`` to at most ``keep`` units, or drop
+        it entirely by default. Call this when some or all of the work it was
+        for has finished (or failed), so unused units don't sit idle until the
+        quota resets.
+        """
+        with self._lock:
+            reservation = self._reservations.get(key)
+            if reservation is None:
+                return
+            reservation.units = min(reservation.units, keep)
+            if reservation.units <= 0:
+                del self._reservations[key]
+
+    def admit(self, key: str, units: int) -> QuotaReservation | None:
+        """
+        Reserve ``units`` of today's quota for the work identified by ``key``.
+        Returns ``None`` if there isn't enough quota left. If there is already
+        a reservation for ``key`` today, it is returned instead.
+        """
+        with self._lock:
+            remaining = self._remaining()
+            if key in self._reservations:
+                return self._reservations[key]
+            if units > remaining:
+                return None
+            reservation = self._reservations[key] = QuotaReservation(self, key, units)
+            return reservation
+
+
+def upload_cost(playlists: int = 0) -> int:
+    """
+    Project the quota cost of uploading a video and adding it to some
+    playlists (assuming each playlist has to be looked up and maybe created).
+    """
+    playlist_cost = QUOTA_COSTS['playlists.list'] + QUOTA_COSTS['playlists.insert'] + QUOTA_COSTS['playlistItems.insert']
+    return QUOTA_COSTS['videos.insert'] + playlists * playlist_cost
+
+
 # Create client from stored authorization credentials.
 def get_youtube_client(credentials_path = DEFAULT_CREDENTIALS_FILE):
+    import google.oauth2.credentials
+    import httplib2
+
+    # Explicitly tell the underlying HTTP transport library not to retry, since
+    # we are handling retry logic ourselves.
+    httplib2.RETRIES = 1
+
     credentials = google.oauth2.credentials.Credentials.from_authorized_user_file(credentials_path)
-    try:
-        return build(API_SERVICE_NAME, API_VERSION, credentials = credentials)
-    except UnknownApiNameOrVersion:
-        pass
-    try:
-        json_path = 'youtube-api-rest.json'
-        with open(path_json) as f:
-            service = json.load(f)
+    return build_client(API_SERVICE_NAME, API_VERSION, credentials=credentials,
+                        bundled_name='youtube-api-rest.json')
+
+
+def get_youtube_client_pool(credentials_path = DEFAULT_CREDENTIALS_FILE,
+                            max_connections = DEFAULT_MAX_CONNECTIONS):
+    """
+    Create a pool of clients that can be used from multiple threads. Call
+    ``pool.client()`` on each thread to get a client for that thread.
+    """
+    import google.oauth2.credentials
+    import httplib2
+
+    # See `get_youtube_client()`.
+    httplib2.RETRIES = 1
 
-        return build_from_document(service, credentials = credentials)
-    except:
-        raise
+    credentials = google.oauth2.credentials.Credentials.from_authorized_user_file(credentials_path)
+    return ClientPool(API_SERVICE_NAME, API_VERSION, credentials, max_connections=max_connections,
+                      bundled_name='youtube-api-rest.json')
 
 
-def validate_youtube_credentials(youtube) -> bool:
+def validate_youtube_credentials(youtube, quota=None) -> bool:
     """
     Make a basic API request to validate the given credentials work. Returns a
     boolean indicating whether credentials are valid.
+
+    Pass a ``QuotaMeter`` or ``QuotaReservation`` as ``quota`` to count the
+    API calls this (and the other functions here) make against the quota.
     """
+    from google.auth.exceptions import GoogleAuthError
+
     try:
         request = youtube.playlists().list(part='id,contentDetails', mine=True)
+        if quota:
+            quota.spend('playlists.list')
         request.execute()
         return True
     except GoogleAuthError:
@@ -104,12 +292,14 @@ def validate_youtube_credentials(youtube) -> bool:
 
 def upload_video(youtube, file, title='Test Title', description=None,
                  category=None, tags=None, privacy_status='private',
-                 recording_date=None, license=None):
+                 recording_date=None, license=None, quota=None):
     """
     Parameters
     ----------
     tags : list of str
     """
+    from googleapiclient.http import MediaFileUpload
+
     metadata = dict(title=title)
     if description:
         metadata['description'] = description
@@ -146,11 +336,16 @@ def upload_video(youtube, file, title='Test Title', description=None,
         media_body=MediaFileUpload(file, chunksize=-1, resumable=True)
     )
 
+    # Resuming an upload doesn't make a new insert, so it's only charged once.
+    if quota:
+        quota.spend('videos.insert')
     return resumable_upload(insert_request)
 
 # This method implements an exponential backoff strategy to resume a
 # failed upload.
 def resumable_upload(request):
+    from googleapiclient.errors import HttpError
+
     response = None
     error = None
     retry = 0
@@ -170,7 +365,7 @@ def resumable_upload(request):
                                                                  e.content)
             else:
                 raise
-        except RETRIABLE_EXCEPTIONS as e:
+        except retriable_exceptions() as e:
             error = 'A retriable error occurred: %s' % e
 
         if error is not None:
@@ -185,18 +380,87 @@ def resumable_upload(request):
             time.sleep(sleep_seconds)
 
 
+def get_videos(youtube, video_ids, part='status,fileDetails', quota=None):
+    """
+    Get info about several videos (50 per request). Returns a dict of video
+    IDs to info. Videos that don't exist (or that we can't see) are left out.
+    """
+    videos = {}
+    unique_ids = list(dict.fromkeys(video_ids))
+    for start in range(0, len(unique_ids), 50):
+        if quota:
+            quota.spend('videos.list')
+        results = youtube.videos().list(id=','.join(unique_ids[start:start + 50]), part=part).execute()
+        for item in results['items']:
+            videos[item['id']] = item
+    return videos
+
+
+def list_uploads(youtube, since=None, quota=None):
+    """
+    List the videos uploaded to the authenticated user's channel, newest
+    first. Each video is a dict with ``id``, ``title``, ``tags``,
+    ``recording_date`` (an ISO 8601 string, or None), and ``file_size`` (the
+    size of the uploaded file, or None if YouTube hasn't processed it yet).
+    If ``since`` (a timezone-aware datetime) is set, stops at videos uploaded
+    before then.
+    """
+    if quota:
+        quota.spend('channels.list')
+    channels = youtube.channels().list(mine=True, part='contentDetails').execute()
+    uploads_id = channels['items'][0]['contentDetails']['relatedPlaylists']['uploads']
+
+    videos = []
+    items = youtube.playlistItems()
+    request = items.list(playlistId=uploads_id, part='snippet', maxResults=50)
+    while request:
+        if quota:
+            quota.spend('playlistItems.list')
+        results = request.execute()
+        request = items.list_next(request, results)
+        for item in results['items']:
+            snippet = item['snippet']
+            # The uploads playlist is in reverse chronological order.
+            if since and datetime.fromisoformat(snippet['publishedAt']) < since:
+                request = None
+                break
+            videos.append({'id': snippet['resourceId']['videoId'], 'title': snippet['title'],
+                           'tags': [], 'recording_date': None, 'file_size': None})
+
+    # Tags, recording dates, and sizes aren't part of playlist items, so look
+    # them up.
+    details = get_videos(youtube, [video['id'] for video in videos], part='snippet,recordingDetails,fileDetails',
+                         quota=quota)
+    for video in videos:
+        if item := details.get(video['id']):
+            video['tags'] = item['snippet'].get('tags', [])
+            video['recording_date'] = item.get('recordingDetails', {}).get('recordingDate')
+            video['file_size'] = item.get('fileDetails', {}).get('fileSize')
+            if video['file_size'] is not None:
+                video['file_size'] = int(video['file_size'])
+
+    return videos
+
+
 # Portions of the playlist code came from:
 # Author: https://github.com/tokland
 # Source: https://github.com/tokland/youtube-upload/blob/master/youtube_upload/playlists.py
 # License: GNU/GPLv3
 
-def find_playlist_id(youtube, title):
+# Playlist IDs by title. Playlists are rarely renamed or deleted, so this
+# saves listing all of them (which costs quota) for every upload.
+_playlist_ids = {}
+_playlist_ids_lock = threading.Lock()
+
+def find_playlist_id(youtube, title, quota=None):
     """Return users's playlist ID by title (None if not found)"""
     playlists = youtube.playlists()
     request = playlists.list(mine=True, part="id,snippet")
     current_encoding = locale.getpreferredencoding()
 
     while request:
+        if quota:
+            quota.spend('playlists.list')
         results = request.execute()
         for item in results["items"]:
             existing_playlist_title = item.get("snippet", {}).get("title")
@@ -204,9 +468,11 @@ def find_playlist_id(youtube, title):
                 return item.get("id")
         request = playlists.list_next(request, results)
 
-def create_playlist(youtube, title, privacy):
+def create_playlist(youtube, title, privacy, quota=None):
     """Create a playlist by title and return its ID"""
     debug(f"Creating playlist: {title}")
+    if quota:
+        quota.spend('playlists.insert')
     response = youtube.playlists().insert(part="snippet,status", body={
         "snippet": {
             "title": title,
@@ -217,8 +483,10 @@ def create_playlist(youtube, title, privacy):
     }).execute()
     return response.get("id")
 
-def add_video_to_existing_playlist(youtube, playlist_id, video_id):
+def add_video_to_existing_playlist(youtube, playlist_id, video_id, quota=None):
     """Add video to playlist (by identifier) and return the playlist ID."""
+    from googleapiclient.errors import HttpError
+
     debug(f"Adding video to playlist: {playlist_id}")
 
     body = {
@@ -233,6 +501,8 @@ def add_video_to_existing_playlist(youtube, playlist_id, video_id):
     }
 
     try:
+        if quota:
+            quota.spend('playlistItems.insert')
         return youtube.playlistItems().insert(part="snippet",
                                               body=body).execute()
     except HttpError as error:
@@ -243,16 +513,24 @@ def add_video_to_existing_playlist(youtube, playlist_id, video_id):
         # appears to provide no way to test for this ahead of time.)
         if parsed and any(error["reason"] == "manualSortRequired" for error in parsed["errors"]):
             del body["snippet"]["position"]
+            if quota:
+                quota.spend('playlistItems.insert')
             return youtube.playlistItems().insert(part="snippet",
                                                   body=body).execute()
         else:
             raise
 
-def add_video_to_playlist(youtube, video_id, title, privacy="unlisted"):
+def add_video_to_playlist(youtube, video_id, title, privacy="unlisted", quota=None):
     """Add video to playlist (by title) and return the full response."""
-    playlist_id = (find_playlist_id(youtube, title) or
-                   create_playlist(youtube, title, privacy))
+    # Hold the lock while looking up or creating the playlist so two threads
+    # can't both create it.
+    with _playlist_ids_lock:
+        playlist_id = _playlist_ids.get(title)
+        if not playlist_id:
+            playlist_id = (find_playlist_id(youtube, title, quota) or
+                           create_playlist(youtube, title, privacy, quota))
+            _playlist_ids[title] = playlist_id
     if playlist_id:
-        return add_video_to_existing_playlist(youtube, playlist_id, video_id)
+        return add_video_to_existing_playlist(youtube, playlist_id, video_id, quota)
     else:
         debug("Error adding video to playlist")
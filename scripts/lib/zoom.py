@@ -1,10 +1,17 @@
 from enum import Enum, StrEnum, auto
 import os.path
-import requests
-from requests import Response
-from zoomus import ZoomClient
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Iterator
 from urllib.parse import urlsplit
 
+from lib import profiling
+
+if TYPE_CHECKING:
+    from requests import Response
+    from zoomus import ZoomClient
+
 
 ZOOM_DOCS_URL = 'https://developers.zoom.us/docs/api/'
 
@@ -36,12 +43,12 @@ class ZoomRole(StrEnum):
 
 
 class ZoomError(Exception):
-    response: Response
+    response: 'Response'
     data: dict
     code: int = 0
     message: str
 
-    def __init__(self, response: Response, message: str | None = None):
+    def __init__(self, response: 'Response', message: str | None = None):
         self.response = response
         try:
             self.data = response.json()
@@ -57,19 +64,104 @@ class ZoomError(Exception):
         )
 
 
-def raise_for_status(response: Response) -> None:
+def raise_for_status(response: 'Response') -> None:
     """Raise ``ZoomError`` if the response has a bad status code."""
     if response.status_code >= 400:
         raise ZoomError(response)
 
 
-def parse_zoom(response: Response) -> dict:
+def parse_zoom(response: 'Response') -> dict:
     """Parse a response from the Zoom API as a dict or raise ``ZoomError``."""
     raise_for_status(response)
     return response.json()
 
 
-def download_zoom_file(client: ZoomClient, url: str, download_directory: str) -> str:
+def list_past_participants(client: 'ZoomClient', meeting_uuid: str, page_size: int = 300) -> Iterator[dict]:
+    """
+    Iterate through all the participants in a past meeting, following
+    pagination. Pages are only loaded as they're needed.
+    """
+    params = {'page_size': page_size}
+    while True:
+        page = parse_zoom(client.past_meeting.get_participants(meeting_id=meeting_uuid, **params))
+        yield from page['participants']
+        if not page.get('next_page_token'):
+            return
+        params['next_page_token'] = page['next_page_token']
+
+
+class Throttle:
+    """
+    Spaces out API calls (from any number of threads) so there are no more
+    than ``rate`` per second.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ParticipantCache:
+    """
+    Remembers whether past meetings had anyone (that counts) in them, by
+    meeting UUID. Once a meeting is over, that can't change, so it never
+    needs to be looked up again. Stored in a SQLite database (the job
+    queue's) so it carries over between runs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        connection = self._connect()
+        try:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS meeting_participants (
+                    uuid TEXT PRIMARY KEY,
+                    had_participants INTEGER NOT NULL,
+                    checked_at REAL NOT NULL
+                )
+            ''')
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def get_many(self, uuids: list[str]) -> dict[str, bool]:
+        """Get the cached answers for any of these meetings that have one."""
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                f'SELECT uuid, had_participants FROM meeting_participants '
+                f'WHERE uuid IN ({", ".join("?" for _ in uuids)})',
+                uuids
+            )
+            return {uuid: bool(had_participants) for uuid, had_participants in rows}
+        finally:
+            connection.close()
+
+    def set(self, uuid: str, had_participants: bool) -> None:
+        connection = self._connect()
+        try:
+            connection.execute(
+                'INSERT OR REPLACE INTO meeting_participants (uuid, had_participants, checked_at) VALUES (?, ?, ?)',
+                (uuid, int(had_participants), time.time())
+            )
+        finally:
+            connection.close()
+
+
+def download_zoom_file(client: 'ZoomClient', url: str, download_directory: str) -> str:
+    import requests
+
     # Note the token info in the client isn't really *public*, but it's
     # not explicitly private, either. Use `config[]` syntax instead of
     # `config.get()` so we get an exception if things have changed and
@@ -85,9 +177,12 @@ def download_zoom_file(client: ZoomClient, url: str, download_directory: str) ->
         r.close()
         return filepath
 
-    with open(filepath, 'wb') as f:
-        for chunk in r.iter_content(chunk_size=1024):
-            if chunk:  # filter out keep-alive new chunks
-                f.write(chunk)
+    # The request is streamed, so the profiler's timing of it stops when the
+    # headers arrive. Time reading the body (usually most of the time) too.
+    with profiling.external('http', f'GET {profiling.endpoint_name(url)} (body)'):
+        with open(filepath, 'wb') as f:
+            for chunk in r.iter_content(chunk_size=1024):
+                if chunk:  # filter out keep-alive new chunks
+                    f.write(chunk)
 
     return filepath
@@ -4,19 +4,30 @@
 Description:
 
     This script downloads cloud recordings from Zoom Meetings and uploads
-    them to YouTube or Google Drive.
+    them to YouTube and/or Google Drive.
 
 Usage:
 
     python scripts/upload_zoom_recordings.py
 
+    Work is tracked in a durable job queue (a SQLite file), with one job per
+    recording file. Jobs that fail are retried with backoff on later runs
+    until they run out of attempts. To keep running and process new
+    recordings (and retries) as they become ready, use `--daemon`.
+
+    Each job downloads, analyzes, processes and uploads its file in one go,
+    since the intermediate files only live in that job's temp directory. A
+    retry redoes the download and processing, but uploads that already
+    finished are saved in the job and skipped.
+
 Environment Variables:
 
     EDGI_ZOOM_CLIENT_ID - Client ID for the Zoom OAuth app for this script
     ZOOM_CLIENT_SECRET - Client Secret for the Zoom OAuth app for this script
     ZOOM_ACCOUNT_ID - Account ID for the Zoom OAuth app for this script
     EDGI_ZOOM_DELETE_AFTER_UPLOAD - If set to 'true', cloud recording will be
-        deleted after upload to YouTube.
+        deleted after it is uploaded to every service and the uploaded copies
+        have been verified.
 
 Configuration:
 
@@ -32,38 +43,75 @@ Configuration:
     See README for how to generate these files.
 """
 
-from argparse import ArgumentParser
+from argparse import SUPPRESS, ArgumentParser, ArgumentTypeError
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-import dateutil.parser
+from functools import cache
+import hashlib
 import json
 import os
 import re
-import subprocess
+import signal
 import sys
 import tempfile
-from zoomus import ZoomClient
-from zoomus.util import encode_uuid
-from lib.constants import MEDIA_TYPE_FOR_EXTENSION, VIDEO_CATEGORY_IDS
-from lib.youtube import get_youtube_client, upload_video, add_video_to_playlist, validate_youtube_credentials
-from lib.gdrive import get_gdrive_client, validate_gdrive_credentials, ensure_folder, is_trashed, upload_file
-from lib.zoom import RecordingStatus, ZoomError, ZoomRole, download_zoom_file, parse_zoom
-
-ZOOM_CLIENT_ID = os.environ['EDGI_ZOOM_CLIENT_ID']
-ZOOM_CLIENT_SECRET = os.environ['EDGI_ZOOM_CLIENT_SECRET']
-ZOOM_ACCOUNT_ID = os.environ['EDGI_ZOOM_ACCOUNT_ID']
+import threading
+import time
+from typing import TYPE_CHECKING
+from lib.constants import (GDRIVE_LOCATION_PATTERNS, MEDIA_TYPE_FOR_EXTENSION, VIDEO_CATEGORY_IDS,
+                           YOUTUBE_PLAYLIST_ROUTES)
+from lib.routing import Router
+from lib.google_api import ClientPool
+from lib.youtube import (DEFAULT_DAILY_QUOTA, QuotaMeter, QuotaReservation, get_videos, get_youtube_client_pool,
+                         is_quota_exceeded, list_uploads, upload_cost, upload_video, add_video_to_playlist,
+                         validate_youtube_credentials)
+from lib.gdrive import (FOLDER_MIME_TYPE, get_files, get_gdrive_client_pool, validate_gdrive_credentials, ensure_folder,
+                        is_trashed, list_folder, upload_file)
+from lib.media import (AudioAnalysis, ProcessingMode, ProcessingOptions, ProcessingResult, Trim,
+                       analyze_audio, plan_trim, process_video, trim_media)
+from lib.transcripts import retime_file
+from lib.profiling import DEFAULT_TOP_COUNT, Profiler
+from lib.metrics import DEFAULT_METRICS_FILE, PERIODS, MetricsRecorder, median_throughput, summarize
+from lib.scheduling import DEFAULT_THROUGHPUT, SchedulePolicy, Scheduler
+from lib.jobqueue import (DEFAULT_QUEUE_FILE, DeferJob, Job, JobHandler, JobQueue, JobStatus, PermanentJobError,
+                          run_job, run_workers)
+from lib.zoom import (ParticipantCache, RecordingStatus, Throttle, ZoomError, ZoomRole, download_zoom_file,
+                      list_past_participants, parse_zoom)
+
+# Zoom, Google, and dateutil are all slow to import, so they are imported
+# where they are used instead of here. That keeps things like `--help` fast.
+if TYPE_CHECKING:
+    from zoomus import ZoomClient
 
 MEETINGS_TO_RECORD = ['EDGI Community Standup']
 DEFAULT_YOUTUBE_PLAYLIST = 'Uploads from Zoom'
 DEFAULT_YOUTUBE_CATEGORY = 'Science & Technology'
 DEFAULT_VIDEO_LICENSE = 'creativeCommon'
 DO_FILTER = False
+UPLOAD_SERVICES = ('gdrive', 'youtube')
+MEGABYTE = 1024 * 1024
+# Don't bother trimming silence from a recording unless it would remove at
+# least this many seconds.
+MIN_TRIM_SECONDS = 30
 
 # Ignore users with names that match these patterns when determining if a
 # meeting has any participants and its recordings should be preserved.
 ZOOM_IGNORE_USER_NAMES = (
     # The otter.ai notetaker bot is always present in most meetings.
-    re.compile(r'Otter\.ai', re.I),
+    r'Otter\.ai',
 )
+# All of the above in one expression, so each name only needs one search.
+ZOOM_IGNORE_USER_NAME_PATTERN = re.compile('|'.join(f'(?:{pattern})' for pattern in ZOOM_IGNORE_USER_NAMES), re.I)
+# Max number of participant lookups to make at once.
+ZOOM_PARTICIPANT_LOOKUPS = 8
+# Deletions are verified and run in batches of this many, and Zoom's delete
+# APIs are called no more than this many times per second.
+ZOOM_DELETE_BATCH_SIZE = 25
+ZOOM_DELETES_PER_SECOND = 2
+# How long to put off deleting a recording whose YouTube copy hasn't been
+# processed yet (so its size can't be checked).
+UNPROCESSED_RETRY_SECONDS = 30 * 60
 
 
 def is_truthy(x):
@@ -86,41 +134,41 @@ def pretty_date(date_string: str) -> str:
     return datetime.strptime(date_string, '%Y-%m-%dT%H:%M:%SZ').strftime('%b %-d, %Y')
 
 
-def meeting_had_no_participants(client: ZoomClient, meeting: dict) -> bool:
-    participants = parse_zoom(client.past_meeting.get_participants(meeting_id=meeting['uuid']))['participants']
-
+def meeting_had_no_participants(client: 'ZoomClient', meeting: dict) -> bool:
+    # Stops loading pages as soon as it finds someone.
     return all(
-        any(p.search(u['name']) for p in ZOOM_IGNORE_USER_NAMES)
-        for u in participants
+        ZOOM_IGNORE_USER_NAME_PATTERN.search(u['name'])
+        for u in list_past_participants(client, meeting['uuid'])
     )
 
 
-def video_has_audio(file_path: str) -> bool:
-    """Detect whether a video file has a non-silent audio track."""
-    result = subprocess.run([
-        'ffmpeg',
-        '-i', file_path,
-        # The `ebur128=peak` looks for the peak loudness level of the audio.
-        '-af', 'ebur128=peak=true',
-        '-f', 'null',
-        '-'
-    ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-
-    # No audio track.
-    if b'audio:0kib' in result.stdout.lower():
-        return False
-
-    # Selent audio. Note that this won't handle things like the low hiss of an
-    # empty room, which will report some low decibel level instead of `-inf`.
-    # In practice, this covers Zoom recordings where a mic was never turned on.
-    # Docs: https://ffmpeg.org/ffmpeg-filters.html#ebur128-1
-    if re.search(rb'Peak:\s+-inf', result.stdout):
-        return False
-
-    return True
+def find_meetings_without_participants(client: 'ZoomClient', meetings: list[dict],
+                                       cache: ParticipantCache) -> set[str]:
+    """
+    Get the UUIDs of the meetings nobody attended. All the meetings must be
+    over. Meetings that aren't cached are looked up concurrently, and any
+    that can't be looked up are treated as if people attended.
+    """
+    uuids = [meeting['uuid'] for meeting in meetings]
+    had_participants = cache.get_many(uuids) if uuids else {}
+    unknown = [meeting for meeting in meetings if meeting['uuid'] not in had_participants]
+    if unknown:
+        with ThreadPoolExecutor(max_workers=ZOOM_PARTICIPANT_LOOKUPS, thread_name_prefix='participants') as executor:
+            futures = {executor.submit(meeting_had_no_participants, client, meeting): meeting for meeting in unknown}
+            for future in as_completed(futures):
+                meeting = futures[future]
+                if error := future.exception():
+                    print(f'⚠️ Could not check who attended {meeting["topic"]} from {meeting["start_time"]}: {error}')
+                    continue
+                had_participants[meeting['uuid']] = not future.result()
+                cache.set(meeting['uuid'], had_participants[meeting['uuid']])
+
+    return {uuid for uuid, attended in had_participants.items() if not attended}
 
 
 def cli_datetime(datetime_string) -> datetime:
+    import dateutil.parser
+
     raw = datetime_string.strip()
     delta = re.match(r'^(\+?)(\d+)([dhm])$', raw)
     if delta:
@@ -138,99 +186,225 @@ def cli_datetime(datetime_string) -> datetime:
         return parsed.astimezone(timezone.utc)
 
 
-def save_to_youtube(youtube, meeting: dict, filepath: str, dry_run: bool) -> None:
-    recording_date = fix_date(meeting['start_time'])
-    title = f'{meeting["topic"]} - {pretty_date(meeting["start_time"])}'
+def recording_videos(meeting: dict) -> list[dict]:
+    # FIXME: we now want to upload all files to gdrive
+    return [file for file in meeting['recording_files']
+            if file['file_type'].lower() == 'mp4']
 
-    print(f'    Uploading {filepath}\n      {title=}\n      {recording_date=}')
-    if not dry_run:
-        video_id = upload_video(youtube,
-                                filepath,
-                                title=title,
-                                category=VIDEO_CATEGORY_IDS["Science & Technology"],
-                                license=DEFAULT_VIDEO_LICENSE,
-                                recording_date=recording_date,
-                                privacy_status='unlisted')
 
+@cache
+def youtube_playlist_router() -> Router:
+    """
+    Load the rules for call-specific playlists from `youtube-playlists.json`
+    (an object mapping playlist titles to patterns) if it exists, or use the
+    built-in ones.
+    """
+    if os.path.exists('youtube-playlists.json'):
+        with open('youtube-playlists.json') as file:
+            return Router.from_dict(json.load(file))
+    return Router.from_dict(YOUTUBE_PLAYLIST_ROUTES)
+
+
+def youtube_playlists(meeting: dict) -> list[str]:
+    """Get the titles of the YouTube playlists a meeting's videos belong in."""
     # Add all videos to default playlist
-    print('    Adding to main playlist: Uploads from Zoom')
-    if not dry_run:
-        add_video_to_playlist(youtube, video_id, title=DEFAULT_YOUTUBE_PLAYLIST, privacy='unlisted')
+    playlists = [DEFAULT_YOUTUBE_PLAYLIST]
 
-    # Add to additional playlists
-    playlist_name = ''
-    if any(x in meeting['topic'].lower() for x in ['web mon', 'website monitoring', 'wm']):
-        playlist_name = 'Website Monitoring'
+    # Add to the last matching call playlist
+    playlist_name = youtube_playlist_router().last(meeting['topic'])
+    if playlist_name:
+        playlists.append(playlist_name)
 
-    if 'data together' in meeting['topic'].lower():
-        playlist_name = 'Data Together'
+    return playlists
 
-    if 'community call' in meeting['topic'].lower():
-        playlist_name = 'Community Calls'
 
-    if 'edgi introductions' in meeting['topic'].lower():
-        playlist_name = 'EDGI Introductions'
+def youtube_title(meeting: dict) -> str:
+    return f'{meeting["topic"]} - {pretty_date(meeting["start_time"])}'
 
-    if 'all-edgi' in meeting['topic'].lower():
-        playlist_name = 'All-EDGI Meetings'
 
-    if playlist_name:
-        print(f'    Adding to call playlist: {playlist_name}')
+def transfer_key(services: list[str], file: dict) -> str:
+    return f'transfer:{",".join(services)}:{file["id"]}'
+
+
+def youtube_upload_cost(meeting: dict) -> int:
+    """Project the YouTube API quota needed to upload all of a meeting's videos."""
+    return len(recording_videos(meeting)) * upload_cost(playlists=len(youtube_playlists(meeting)))
+
+
+def zoom_file_properties(file: dict, filepath: str) -> dict[str, str]:
+    """
+    Identify the Zoom file an upload of ``filepath`` was made from, so the
+    upload can be matched to it later even if another recording has the
+    same name (e.g. two sessions of a meeting on the same day), and checked
+    before deleting the Zoom file. These are saved as GDrive
+    ``appProperties`` and as YouTube tags (see ``youtube_tags()``).
+    """
+    return {'zoomFileId': file['id'], 'zoomFileSize': str(file['file_size']),
+            'zoomUploadSize': str(os.path.getsize(filepath))}
+
+
+def youtube_tags(file: dict, filepath: str) -> list[str]:
+    return [f'{key}:{value}' for key, value in zoom_file_properties(file, filepath).items()]
+
+
+def youtube_tag_properties(tags: list[str]) -> dict[str, str]:
+    """Get the properties from ``youtube_tags()`` back out of a video's tags."""
+    return dict(tag.split(':', 1) for tag in tags if tag.startswith('zoom') and ':' in tag)
+
+
+class UploadProgress:
+    """
+    Tracks which steps of saving a file to a service (uploading the video,
+    adding it to each playlist, uploading each extra file) are done. Each
+    step is saved in the job's payload as soon as it finishes, so a retry
+    picks up where the last attempt left off instead of uploading the video
+    again.
+    """
+
+    def __init__(self, queue: JobQueue, job: Job, service: str, lock: threading.Lock):
+        self.queue = queue
+        self.job = job
+        self.lock = lock
+        with lock:
+            self.steps = job.payload.setdefault('progress', {}).setdefault(service, {})
+
+    def get(self, step: str):
+        with self.lock:
+            return self.steps.get(step)
+
+    def finish(self, step: str, value=True) -> None:
+        with self.lock:
+            self.steps[step] = value
+            self.queue.save_payload(self.job)
+
+
+def save_to_youtube(youtube, meeting: dict, file: dict, filepath: str, dry_run: bool, progress: UploadProgress,
+                    quota: QuotaMeter | QuotaReservation | None = None) -> dict | None:
+    """
+    Upload a video and add it to playlists. Returns a record of the upload
+    (unless this is a dry run).
+    """
+    recording_date = fix_date(meeting['start_time'])
+    title = youtube_title(meeting)
+
+    upload = progress.get('video')
+    if upload:
+        print(f'    Already uploaded {filepath} as video {upload["id"]}')
+    else:
+        print(f'    Uploading {filepath}\n      {title=}\n      {recording_date=}')
+        if not dry_run:
+            video_id = upload_video(youtube,
+                                    filepath,
+                                    title=title,
+                                    category=VIDEO_CATEGORY_IDS["Science & Technology"],
+                                    license=DEFAULT_VIDEO_LICENSE,
+                                    tags=youtube_tags(file, filepath),
+                                    recording_date=recording_date,
+                                    privacy_status='unlisted',
+                                    quota=quota)
+            upload = {'id': video_id, 'size': os.path.getsize(filepath)}
+            progress.finish('video', upload)
+
+    for index, playlist_name in enumerate(youtube_playlists(meeting)):
+        if progress.get(f'playlist:{playlist_name}'):
+            continue
+        print(f'    Adding to {"main" if index == 0 else "call"} playlist: {playlist_name}')
         if not dry_run:
-            add_video_to_playlist(youtube, video_id, title=playlist_name, privacy='unlisted')
+            add_video_to_playlist(youtube, upload['id'], title=playlist_name, privacy='unlisted', quota=quota)
+            progress.finish(f'playlist:{playlist_name}')
 
     # TODO: save the chat log transcript in a comment on the video.
 
+    return upload
 
-def save_to_gdrive(client, meeting: dict, filepath: str, dry_run: bool,
-                   zoom_client: ZoomClient, tempdir: str) -> None:
-    recording_date = dateutil.parser.isoparse(meeting['start_time'])
 
+@cache
+def gdrive_locations() -> tuple[dict, Router]:
+    """
+    Load the locations from `gdrive-locations.json` and a router that picks
+    one for a meeting topic. Locations can have a `pattern` to set or
+    override the one in `GDRIVE_LOCATION_PATTERNS`.
+    """
     with open('gdrive-locations.json') as file:
-        location_options = json.load(file)
-
-    topic = meeting['topic']
-    if re.search(r'\bac meeting', topic, flags=re.IGNORECASE):
-        location = location_options['ac']
-    elif re.search(r'\beew\b', topic, flags=re.IGNORECASE):
-        location = location_options['eew']
-    elif 'all-edgi' in topic.lower():
-        location = location_options['all_edgi']
-    else:
-        location = location_options['default']
+        locations = json.load(file)
+
+    patterns = dict(GDRIVE_LOCATION_PATTERNS)
+    for key, location in locations.items():
+        if key != 'default' and location.get('pattern'):
+            patterns[key] = location['pattern']
+    router = Router.from_dict({key: pattern for key, pattern in patterns.items() if key in locations})
+    return locations, router
+
+
+def gdrive_location(topic: str) -> dict:
+    """Pick the GDrive location (from `gdrive-locations.json`) for a meeting."""
+    locations, router = gdrive_locations()
+    return locations[router.first(topic, default='default')]
+
+
+def gdrive_subfolder_name(location: dict, meeting: dict) -> str | None:
+    """Get the name of the subfolder of the location folder to use, if any."""
+    import dateutil.parser
+
+    if location['subfolder_pattern']:
+        recording_date = dateutil.parser.isoparse(meeting['start_time'])
+        return location['subfolder_pattern'].format(year=recording_date.year)
+    return None
+
+
+def gdrive_meeting_name(meeting: dict) -> str:
+    """Get the name of a meeting's folder (and the base name of its files)."""
+    import dateutil.parser
+
+    recording_date = dateutil.parser.isoparse(meeting['start_time'])
+    return f'{recording_date:%Y-%m-%d} {meeting["topic"]}'
+
+
+def save_to_gdrive(client, meeting: dict, file: dict, filepath: str, dry_run: bool, progress: UploadProgress,
+                   zoom_client: 'ZoomClient', tempdir: str, trim: Trim | None = None) -> dict | None:
+    """
+    Upload a video and the meeting's other files to GDrive. Returns a
+    record of the video's upload (unless this is a dry run).
+    """
+    location = gdrive_location(meeting['topic'])
 
     folder_id = location['folder']
     if is_trashed(client, folder_id):
         raise RuntimeError(f'Cannot upload to GDrive folder "{folder_id}"; it is in the trash!')
 
-    if location['subfolder_pattern']:
-        subfolder_name = location['subfolder_pattern'].format(year=recording_date.year)
-        if not dry_run:
-            folder_id = ensure_folder(client, location['folder'], subfolder_name)
+    subfolder_name = gdrive_subfolder_name(location, meeting)
+    if subfolder_name and not dry_run:
+        folder_id = ensure_folder(client, location['folder'], subfolder_name)
 
-    iso_date = recording_date.strftime('%Y-%m-%d')
-    meeting_name = f'{iso_date} {topic}'
+    meeting_name = gdrive_meeting_name(meeting)
     print(f'    Creating meeting folder "{meeting_name}" in https://drive.google.com/drive/folders/{folder_id} ...')
     if not dry_run:
         meeting_folder = ensure_folder(client, folder_id, meeting_name)
 
     # Upload files to folder_id
     upload_name = f'{meeting_name}.mp4'
-    print(f'    Uploading {filepath}\n      {upload_name=}')
-    if not dry_run:
-        upload_file(
-            client,
-            filepath,
-            folder_id=meeting_folder,
-            name=f'{meeting_name}.mp4',
-            media_type='video/mp4',
-        )
-
-    for file in meeting['recording_files']:
-        download_url = file['download_url']
-        extension = file['file_extension'].lower()
+    upload = progress.get('video')
+    if upload:
+        print(f'    Already uploaded {filepath} as file {upload["id"]}')
+    else:
+        print(f'    Uploading {filepath}\n      {upload_name=}')
+        if not dry_run:
+            video_file_id = upload_file(
+                client,
+                filepath,
+                folder_id=meeting_folder,
+                name=f'{meeting_name}.mp4',
+                media_type='video/mp4',
+                properties=zoom_file_properties(file, filepath),
+            )
+            upload = {'id': video_file_id, 'size': os.path.getsize(filepath), 'md5': file_md5(filepath)}
+            progress.finish('video', upload)
+
+    for other_file in meeting['recording_files']:
+        download_url = other_file['download_url']
+        extension = other_file['file_extension'].lower()
         upload_name = None
-        match file['file_type'].lower():
+        match other_file['file_type'].lower():
             case 'mp4':
                 # We are already handling this file; nothing to do here.
                 pass
@@ -246,7 +420,9 @@ def save_to_gdrive(client, meeting: dict, filepath: str, dry_run: bool,
                 print('      Nothing uploaded for this file.')
                 continue
 
-        if upload_name:
+        if upload_name and progress.get(f'file:{upload_name}'):
+            print(f'    Already uploaded {upload_name}')
+        elif upload_name:
             # TODO: The upload command can guess based on file extension; it
             # does the right thing for all but ".m4a", and maybe that's OK
             # enough. Consider dropping this.
@@ -255,6 +431,12 @@ def save_to_gdrive(client, meeting: dict, filepath: str, dry_run: bool,
                 raise ValueError(f'No known media type for file extension "{extension}"')
 
             filepath = download_zoom_file(zoom_client, download_url, tempdir)
+            if trim:
+                # Keep the other files in sync with the trimmed video.
+                if extension == 'm4a':
+                    filepath, _ = trim_media(filepath, trim, snap_to_keyframe=False)
+                elif extension in ('vtt', 'txt'):
+                    retime_file(filepath, trim.start, trim.end - trim.start)
             print(f'    Uploading {filepath}\n      {upload_name=}')
             if not dry_run:
                 upload_file(
@@ -264,128 +446,988 @@ def save_to_gdrive(client, meeting: dict, filepath: str, dry_run: bool,
                     name=upload_name,
                     media_type=media_type,
                 )
+                progress.finish(f'file:{upload_name}')
+
+    return upload
+
+
+def file_md5(filepath: str) -> str:
+    with open(filepath, 'rb') as file:
+        return hashlib.file_digest(file, 'md5').hexdigest()
+
+
+def check_copy(service: str, upload: dict, copy: dict | None) -> str | None:
+    """
+    Compare a copy of a video found on a service with the record of what was
+    uploaded (a dict with ``id``, ``size``, and optionally ``md5``). Returns
+    a description of the problem, or ``None`` if the copy is good. A copy
+    is only good if its size (or checksum) could be compared. Raises
+    ``DeferJob`` if the copy can't be checked yet.
+    """
+    if copy is None:
+        return 'it does not exist'
+
+    match service:
+        case 'gdrive':
+            if copy.get('trashed'):
+                return 'it is in the trash'
+            size = copy.get('size')
+            md5 = copy.get('md5Checksum')
+        case 'youtube':
+            status = copy.get('status', {}).get('uploadStatus')
+            if status not in ('uploaded', 'processed'):
+                return f'its upload status is "{status}"'
+            size = copy.get('fileDetails', {}).get('fileSize')
+            md5 = None
+            if size is None:
+                # Only available once YouTube has processed the video.
+                raise DeferJob(f'YouTube copy {upload["id"]} has not been processed yet',
+                               until=time.time() + UNPROCESSED_RETRY_SECONDS)
+        case _:
+            raise ValueError(f'Unknown service type: "{service}"')
+
+    compared = False
+    if size is not None and upload.get('size') is not None:
+        if int(size) != upload['size']:
+            return f'it is {int(size)} bytes, but {upload["size"]} bytes were uploaded'
+        compared = True
+    if md5 and upload.get('md5'):
+        if md5 != upload['md5']:
+            return 'its MD5 checksum does not match the uploaded file'
+        compared = True
+    if not compared:
+        return 'there is no size or checksum to compare it with'
+    return None
+
+
+def delete_payload(meeting: dict, file: dict, services: list[str], uploads: dict) -> dict:
+    """
+    Make the payload for a job that deletes a file from Zoom. ``uploads`` has
+    the record of the copy on each of ``services``, which is verified first.
+    """
+    return {'meeting': meeting, 'file': file, 'services': list(services), 'uploads': uploads}
+
+
+def matches_zoom_file(properties: dict[str, str], file: dict) -> bool:
+    """Check whether an upload's ``zoom_file_properties()`` are for a Zoom file."""
+    return properties.get('zoomFileId') == file['id'] and properties.get('zoomFileSize') == str(file['file_size'])
+
+
+class PublishedIndex:
+    """
+    Finds recordings that are already published, so they can be skipped
+    without downloading them again (e.g. if deleting them from Zoom failed
+    or is turned off).
+
+    Uploads are matched to Zoom files by the ``zoom_file_properties()`` saved
+    with them. Uploads from before those were saved are matched by name (or
+    title and recording time) *and* by size. They were never processed, so
+    they should be exactly the same size as the Zoom file. A name alone is
+    not enough, since several recordings can have the same one.
+
+    Each service's listings are loaded once, the first time they're needed.
+    For YouTube, that's the channel's uploads since ``since``. For GDrive,
+    it's each destination folder.
+    """
+
+    def __init__(self, pipeline: 'Pipeline', since: datetime):
+        self.pipeline = pipeline
+        self.since = since
+        self._youtube_videos: list[dict] | None = None
+        self._gdrive_folders: dict[str, list[dict]] = {}
+
+    def published_services(self, meeting: dict, file: dict) -> dict[str, dict]:
+        """
+        Find the services that already have a Zoom file's video. Returns a
+        dict of those services to the copy on each, recorded the same way as
+        uploads (so they can be verified before deleting).
+        """
+        published = {}
+        for service in self.pipeline.services:
+            try:
+                if copy := self.published_copy(service, meeting, file):
+                    published[service] = copy
+            except Exception as error:
+                print(f'  ⚠️ Could not check whether video is already on {service}: {error}')
+        return published
+
+    def published_copy(self, service: str, meeting: dict, file: dict) -> dict | None:
+        """Find the copy of a Zoom file's video on a service, if there is one."""
+        match service:
+            case 'youtube':
+                return self._youtube_copy(meeting, file)
+            case 'gdrive':
+                return self._gdrive_copy(meeting, file)
+            case _:
+                raise ValueError(f'Unknown service type: "{service}"')
+
+    def _youtube_copy(self, meeting: dict, file: dict) -> dict | None:
+        if self._youtube_videos is None:
+            self._youtube_videos = list_uploads(self.pipeline.upload_client('youtube'), since=self.since,
+                                                quota=self.pipeline.quota)
+
+        title = youtube_title(meeting)
+        # YouTube may only keep the date part of a video's recording date.
+        start_date = datetime.fromisoformat(meeting['start_time']).date()
+        for video in self._youtube_videos:
+            properties = youtube_tag_properties(video['tags'])
+            if properties:
+                found = matches_zoom_file(properties, file)
+            else:
+                found = (video['title'] == title
+                         and video['recording_date'] is not None
+                         and datetime.fromisoformat(video['recording_date']).date() == start_date
+                         and video['file_size'] == file['file_size'])
+            if found:
+                size = video['file_size']
+                if size is None and properties.get('zoomUploadSize'):
+                    size = int(properties['zoomUploadSize'])
+                return {'id': video['id'], 'size': size}
+        return None
+
+    def _gdrive_folder(self, folder_id: str) -> list[dict]:
+        if folder_id not in self._gdrive_folders:
+            self._gdrive_folders[folder_id] = list_folder(self.pipeline.upload_client('gdrive'), folder_id)
+        return self._gdrive_folders[folder_id]
+
+    def _gdrive_subfolder(self, folder_id: str, name: str) -> str | None:
+        return next((item['id'] for item in self._gdrive_folder(folder_id)
+                     if item['name'] == name and item['mimeType'] == FOLDER_MIME_TYPE), None)
+
+    def _gdrive_copy(self, meeting: dict, file: dict) -> dict | None:
+        location = gdrive_location(meeting['topic'])
+        folder_id = location['folder']
+        subfolder_name = gdrive_subfolder_name(location, meeting)
+        if subfolder_name:
+            folder_id = self._gdrive_subfolder(folder_id, subfolder_name)
+
+        meeting_name = gdrive_meeting_name(meeting)
+        meeting_folder_id = folder_id and self._gdrive_subfolder(folder_id, meeting_name)
+        if not meeting_folder_id:
+            return None
+        for item in self._gdrive_folder(meeting_folder_id):
+            if 'size' not in item:
+                continue
+            properties = item.get('appProperties', {})
+            if properties:
+                found = matches_zoom_file(properties, file)
+            else:
+                found = item['name'] == f'{meeting_name}.mp4' and int(item['size']) == file['file_size']
+            if found:
+                return {'id': item['id'], 'size': int(item['size']), 'md5': item.get('md5Checksum')}
+        return None
+
+
+def cli_duration(duration_string) -> float:
+    """Parse a duration like "90s", "15m", or "2h" into seconds."""
+    match = re.match(r'^(\d+(?:\.\d+)?)([smh]?)$', duration_string.strip())
+    if not match:
+        raise ArgumentTypeError(f'Invalid duration: "{duration_string}"')
+    unit = {'': 1, 's': 1, 'm': 60, 'h': 60 * 60}[match.group(2)]
+    return float(match.group(1)) * unit
+
+
+def cli_bitrate(bitrate_string) -> int:
+    """Parse a bitrate like "800k" or "1.5M" into bits/second."""
+    match = re.match(r'^(\d+(?:\.\d+)?)([kKmM]?)$', bitrate_string.strip())
+    if not match:
+        raise ArgumentTypeError(f'Invalid bitrate: "{bitrate_string}"')
+    unit = {'': 1, 'k': 1_000, 'm': 1_000_000}[match.group(2).lower()]
+    return int(float(match.group(1)) * unit)
+
+
+def cli_services(services_string) -> list[str]:
+    """Parse a comma-separated list of services to upload to."""
+    services = []
+    for service in services_string.split(','):
+        service = service.strip().lower()
+        if service not in UPLOAD_SERVICES:
+            raise ArgumentTypeError(f'Unknown service type: "{service}" (choose from {", ".join(UPLOAD_SERVICES)})')
+        if service not in services:
+            services.append(service)
+    return services
+
+
+def get_upload_pool(service: str) -> ClientPool:
+    match service:
+        case 'gdrive':
+            return get_gdrive_client_pool()
+        case 'youtube':
+            return get_youtube_client_pool()
+        case _:
+            raise ValueError(f'Unknown service type: "{service}"')
+
+
+@dataclass
+class Pipeline:
+    """Clients and settings shared by all the jobs in a run."""
+    zoom: 'ZoomClient'
+    queue: JobQueue
+    services: list[str]
+    dry_run: bool
+    metrics: MetricsRecorder
+    processing: ProcessingOptions = field(default_factory=ProcessingOptions)
+    # Seconds of silence to leave when trimming silence from the start and
+    # end of recordings. If `None`, recordings are not trimmed.
+    trim_margin: float | None = None
+    # Number of jobs that will be worked on at once.
+    workers: int = 1
+    upload_pools: dict[str, ClientPool] = field(default_factory=dict)
+    # Tracks YouTube API quota, if uploading to YouTube.
+    quota: QuotaMeter | None = None
+    # Paces calls to Zoom's delete APIs.
+    zoom_deletes: Throttle = field(default_factory=lambda: Throttle(ZOOM_DELETES_PER_SECOND))
+
+    def __post_init__(self):
+        for service in self.services:
+            if service not in self.upload_pools:
+                self.upload_pools[service] = get_upload_pool(service)
+        # Each job uploads to all its services at once.
+        self._uploads = ThreadPoolExecutor(max_workers=self.workers * len(self.services),
+                                           thread_name_prefix='upload')
+
+    def upload_client(self, service: str):
+        # Google API clients are not thread-safe, so each thread gets its own
+        # client from the pool.
+        return self.upload_pools[service].client()
+
+    def handlers(self) -> dict[str, JobHandler]:
+        # Deletions are handled separately, by `run_deletions()`.
+        return {
+            'transfer': self.transfer_recording,
+        }
+
+    def delete_handlers(self) -> dict[str, JobHandler]:
+        return {
+            'delete': self.delete_recording_file,
+            'delete_meeting': self.delete_meeting_recordings,
+        }
+
+    def transfer_recording(self, job: Job) -> None:
+        meeting = job.payload['meeting']
+        file = job.payload['file']
+        destinations = job.payload.setdefault('destinations', {service: 'pending' for service in self.services})
+        pending = [service for service, status in destinations.items() if status != 'done']
+
+        # Only start on YouTube if there's enough quota left today to upload
+        # the rest of the meeting's videos and add them to playlists.
+        # Otherwise we could use it up halfway through and leave the meeting
+        # half-done. Other services are still uploaded to in the meantime.
+        quota_error = None
+        quota_key = None
+        youtube_quota = None
+        if 'youtube' in pending and self.quota:
+            try:
+                quota_key, cost = self.youtube_quota_request(job)
+                youtube_quota = self.quota.admit(quota_key, cost)
+                if not youtube_quota:
+                    quota_error = DeferJob(f'Not enough YouTube quota left today (needs {cost} units, '
+                                           f'{self.quota.remaining()} left)', until=self.quota.next_reset())
+            except PermanentJobError as error:
+                quota_error = error
+            if quota_error:
+                pending.remove('youtube')
+
+        try:
+            if not pending and not quota_error:
+                print(f'Already transferred {file["file_type"]} file for meeting: {meeting["topic"]} '
+                      f'from {meeting["start_time"]}')
+            elif pending:
+                with self.metrics.measure('transfer', file['id']) as measurement:
+                    measurement['bytes'] = file['file_size']
+                    self.download_and_save(job, pending, youtube_quota)
+        finally:
+            if youtube_quota:
+                # Only keep what the meeting's other videos still need.
+                keep = self.youtube_cost(meeting, exclude=job) if quota_key == meeting['uuid'] else 0
+                self.quota.release(quota_key, keep=keep)
+
+        if quota_error:
+            raise quota_error
+
+        if ZOOM_DELETE_AFTER_UPLOAD and not self.dry_run:
+            if job.payload.get('silent'):
+                print('    Not deleting from Zoom: nothing was uploaded, so there is no copy to keep.')
+            else:
+                self.queue.enqueue(f'delete:{file["id"]}', 'delete',
+                                   delete_payload(meeting, file, list(destinations), job.payload.get('uploads', {})))
+
+    def youtube_cost(self, meeting: dict, exclude: Job | None = None) -> int:
+        """
+        Project the YouTube quota needed for a meeting's videos that are
+        queued and still need to be uploaded to YouTube (except ``exclude``).
+        """
+        count = 0
+        for file in recording_videos(meeting):
+            other = self.queue.get(transfer_key(self.services, file))
+            if (other
+                    and not (exclude and other.id == exclude.id)
+                    and other.status in (JobStatus.PENDING, JobStatus.RUNNING)
+                    and other.payload.get('destinations', {}).get('youtube') != 'done'):
+                count += 1
+        return count * upload_cost(playlists=len(youtube_playlists(meeting)))
+
+    def youtube_quota_request(self, job: Job) -> tuple[str, int]:
+        """
+        Decide what key and how many units of YouTube quota to reserve before
+        uploading a job's video. That's normally enough for all the meeting's
+        remaining videos, but meetings that could never fit in a day's quota
+        are uploaded a video at a time. Raises ``PermanentJobError`` if even
+        one video can't fit.
+        """
+        meeting = job.payload['meeting']
+        file = job.payload['file']
+        video_cost = upload_cost(playlists=len(youtube_playlists(meeting)))
+        if video_cost > self.quota.daily_limit:
+            raise PermanentJobError(f'Uploading this video to YouTube needs {video_cost} units of quota, '
+                                    f'more than the daily limit of {self.quota.daily_limit}')
+
+        cost = max(video_cost, self.youtube_cost(meeting))
+        if cost > self.quota.daily_limit:
+            return file['id'], video_cost
+        return meeting['uuid'], cost
+
+    def download_and_save(self, job: Job, services: list[str],
+                          youtube_quota: QuotaReservation | None = None) -> None:
+        meeting = job.payload['meeting']
+        file = job.payload['file']
+        print(f'Transferring {file["file_type"]} file for meeting: {meeting["topic"]} from {meeting["start_time"]} '
+              f'to {", ".join(services)} (attempt {job.attempts})')
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            url = file['download_url']
+            print(f'    Download from {url}...')
+            with self.metrics.measure('download', file['id']) as measurement:
+                filepath = download_zoom_file(self.zoom, url, tempdir)
+                measurement['bytes'] = os.path.getsize(filepath)
+
+            with self.metrics.measure('analyze', file['id']) as measurement:
+                measurement['bytes'] = os.path.getsize(filepath)
+                analysis = analyze_audio(filepath)
+            if analysis.has_audio:
+                with self.metrics.measure('trim', file['id']) as measurement:
+                    measurement['bytes'] = os.path.getsize(filepath)
+                    filepath, trim = self.trim_silence(filepath, analysis)
+                if trim:
+                    job.payload['trim'] = {'start': trim.start, 'end': trim.end, 'original_duration': analysis.duration}
+                with self.metrics.measure('process', file['id']) as measurement:
+                    measurement['bytes'] = os.path.getsize(filepath)
+                    filepath, processed = self.process_video(filepath)
+                upload_start = time.perf_counter()
+                self.save_to_destinations(job, services, meeting, file, filepath, tempdir, trim, youtube_quota)
+                if processed.action != 'none':
+                    job.payload['processing'] = self.record_processing(processed, time.perf_counter() - upload_start)
+            else:
+                print('    Skipping upload: video was silent (no mics were on).')
+                job.payload['silent'] = True
+
+    def save_to_destinations(self, job: Job, services: list[str], meeting: dict, file: dict, filepath: str,
+                             tempdir: str, trim: Trim | None, youtube_quota: QuotaReservation | None = None) -> None:
+        """
+        Upload a file to several services at once. Each step of each upload
+        (see ``UploadProgress``) is saved as soon as it finishes, so a retry
+        only repeats the steps that failed. When a service is done, the ID,
+        size, and checksum of the video uploaded to it are saved so the copy
+        can be verified before deleting the recording from Zoom. Raises the
+        first error if any of the uploads failed.
+        """
+        from googleapiclient.errors import HttpError
+
+        payload_lock = threading.Lock()
+
+        def save(service: str) -> dict | None:
+            client = self.upload_client(service)
+            progress = UploadProgress(self.queue, job, service, payload_lock)
+            with self.metrics.measure(f'upload:{service}', file['id']) as measurement:
+                measurement['bytes'] = os.path.getsize(filepath)
+                if service == 'gdrive':
+                    return save_to_gdrive(client, meeting, file, filepath, self.dry_run, progress, self.zoom, tempdir,
+                                          trim)
+                elif service == 'youtube':
+                    try:
+                        return save_to_youtube(client, meeting, file, filepath, self.dry_run, progress,
+                                               quota=youtube_quota or self.quota)
+                    except HttpError as error:
+                        # Something else may have used up the quota.
+                        if self.quota and is_quota_exceeded(error):
+                            self.quota.exhaust()
+                            raise DeferJob('YouTube quota exceeded', until=self.quota.next_reset()) from error
+                        raise
+
+        errors = []
+        futures = {self._uploads.submit(save, service): service for service in services}
+        for future in as_completed(futures):
+            service = futures[future]
+            if error := future.exception():
+                print(f'    ❌ Upload to {service} failed: {error}')
+                errors.append(error)
+            else:
+                with payload_lock:
+                    job.payload['destinations'][service] = 'done'
+                    if upload := future.result():
+                        job.payload.setdefault('uploads', {})[service] = upload
+                    self.queue.save_payload(job)
+                print(f'    ✅ Uploaded to {service}')
+
+        if errors:
+            # Prefer real failures over uploads that were only deferred.
+            errors.sort(key=lambda error: isinstance(error, DeferJob))
+            raise errors[0]
+
+    def trim_silence(self, filepath: str, analysis: AudioAnalysis) -> tuple[str, Trim | None]:
+        if self.trim_margin is None:
+            return filepath, None
+
+        planned = plan_trim(analysis, margin=self.trim_margin, min_trim=MIN_TRIM_SECONDS)
+        if not planned:
+            return filepath, None
+
+        filepath, trim = trim_media(filepath, planned)
+        print(f'    Trimmed silence: kept {trim.start:.1f}s to {trim.end:.1f}s '
+              f'of {analysis.duration:.1f}s recording')
+        return filepath, trim
+
+    def process_video(self, filepath: str) -> tuple[str, ProcessingResult]:
+        if self.processing.mode != ProcessingMode.NONE:
+            print(f'    Processing video ({self.processing.mode})...')
+        filepath, result = process_video(filepath, self.processing)
+        if result.action != 'none':
+            savings = ''
+            if result.projected_savings is not None:
+                savings = f', projected savings {result.projected_savings:.0%}'
+            print(f'    Processed video ({result.action}{savings}) in {result.seconds:.1f} seconds: '
+                  f'{result.original_size / MEGABYTE:.1f} MB → {result.final_size / MEGABYTE:.1f} MB')
+        return filepath, result
+
+    def record_processing(self, result: ProcessingResult, upload_seconds: float) -> dict:
+        """
+        Summarize the effects of processing a video. The upload time saved is
+        estimated from how fast the processed file was actually uploaded.
+        """
+        upload_seconds_saved = 0.0
+        if result.final_size and not self.dry_run:
+            upload_seconds_saved = upload_seconds * result.bytes_saved / result.final_size
+        print(f'    Processing saved {result.bytes_saved / MEGABYTE:.1f} MB and '
+              f'~{upload_seconds_saved:.0f} seconds of upload time (took {result.seconds:.0f} seconds)')
+        return dict(result.to_dict(), bytes_saved=result.bytes_saved, upload_seconds_saved=upload_seconds_saved)
+
+    def run_deletions(self, stop: threading.Event | None = None, poll_interval: float = 5) -> None:
+        """
+        Work on deletion jobs in batches, separately from the transfer workers
+        so Zoom API calls never hold up uploads.
+
+        If ``stop`` is not set, this returns as soon as there are no deletions
+        ready to run. Otherwise, it keeps polling for new ones until the event
+        is set, then finishes any that are ready.
+        """
+        stages = list(self.delete_handlers().keys())
+        while True:
+            jobs = self.queue.claim_many(stages, limit=ZOOM_DELETE_BATCH_SIZE)
+            if jobs:
+                self.delete_batch(jobs)
+            elif stop and not stop.is_set():
+                stop.wait(poll_interval)
+            else:
+                return
+
+    def delete_batch(self, jobs: list[Job]) -> None:
+        """Verify the uploaded copies for a batch of claimed deletion jobs, then run them."""
+        handlers = self.delete_handlers()
+        with self.metrics.measure('verify_uploads'):
+            problems = self.verify_uploads([job for job in jobs if job.stage == 'delete'])
+
+        def unverified(job: Job) -> None:
+            raise problems[job.id]
+
+        for job in jobs:
+            run_job(self.queue, job, unverified if job.id in problems else handlers[job.stage])
+
+    def verify_uploads(self, jobs: list[Job]) -> dict[int, Exception]:
+        """
+        Check that the copies uploaded for each deletion job are still there
+        and match what was uploaded, with one batch of lookups per service.
+        Returns errors for the jobs that could not be verified, by job ID.
+        Missing or mismatched copies are permanent errors (someone should
+        look into them), failed lookups can be retried, and copies that
+        can't be checked yet are deferred.
+        """
+        problems: dict[int, Exception] = {}
+        by_service: dict[str, list[tuple[Job, dict]]] = defaultdict(list)
+        for job in jobs:
+            uploads = job.payload.get('uploads', {})
+            missing = [service for service in job.payload.get('services', self.services) if service not in uploads]
+            if missing:
+                problems[job.id] = PermanentJobError(f'Not deleting: no upload to {", ".join(missing)} was recorded')
+                continue
+            for service, upload in uploads.items():
+                by_service[service].append((job, upload))
+
+        for service, uploads in by_service.items():
+            try:
+                copies = self.find_copies(service, [upload['id'] for _, upload in uploads])
+            except Exception as error:
+                for job, _ in uploads:
+                    problems.setdefault(job.id, error)
+                continue
+
+            for job, upload in uploads:
+                try:
+                    problem = check_copy(service, upload, copies.get(upload['id']))
+                except DeferJob as error:
+                    problems.setdefault(job.id, error)
+                    continue
+                if problem and job.id not in problems:
+                    problems[job.id] = PermanentJobError(f'Not deleting: copy on {service} ({upload["id"]}) '
+                                                         f'could not be verified; {problem}')
+
+        return problems
+
+    def find_copies(self, service: str, ids: list[str]) -> dict[str, dict | None]:
+        """Look up uploaded copies on a service by ID."""
+        client = self.upload_client(service)
+        match service:
+            case 'gdrive':
+                return get_files(client, ids)
+            case 'youtube':
+                return get_videos(client, ids, quota=self.quota)
+            case _:
+                raise ValueError(f'Unknown service type: "{service}"')
+
+    def delete_recording_file(self, job: Job) -> None:
+        """
+        Delete a file from Zoom. This does not check that the file was
+        uploaded; it should only be run by ``delete_batch()``, which does.
+        """
+        from zoomus.util import encode_uuid
+
+        meeting = job.payload['meeting']
+        file = job.payload['file']
+        self.zoom_deletes.wait()
+        with self.metrics.measure('delete', file['id']):
+            try:
+                # Just delete the video for now, since that takes the most storage space.
+                parse_zoom(self.zoom.recording.delete_single_recording(
+                    meeting_id=encode_uuid(file['meeting_id']),
+                    recording_id=file['id'],
+                    action='trash'
+                ))
+                print(f'  🗑️ Deleted {file["file_type"]} file from Zoom for recording: {meeting["topic"]}')
+            except ZoomError as error:
+                if error.response.status_code != 404:
+                    raise
+                print(f'  🗑️ {file["file_type"]} file for recording "{meeting["topic"]}" was already deleted.')
+
+    def delete_meeting_recordings(self, job: Job) -> None:
+        from zoomus.util import encode_uuid
+
+        meeting = job.payload['meeting']
+        self.zoom_deletes.wait()
+        try:
+            parse_zoom(self.zoom.recording.delete(
+                meeting_id=encode_uuid(meeting['uuid']),
+                action='trash'
+            ))
+            print(f'  🗑️ Deleted recording: {meeting["topic"]} from {meeting["start_time"]}')
+        except ZoomError as error:
+            if error.response.status_code != 404:
+                raise
+            print(f'  🗑️ Recording "{meeting["topic"]}" from {meeting["start_time"]} was already deleted.')
+
+
+def enqueue_meetings(pipeline: Pipeline, zoom_user_id: str, from_time: datetime, to_time: datetime) -> int:
+    """
+    Find recordings in Zoom and add jobs to the queue for any work that needs
+    to be done on them. Returns the number of new jobs.
+    """
+    zoom = pipeline.zoom
+    index = PublishedIndex(pipeline, since=from_time)
+    added = 0
+
+    print('Looking for videos to upload between '
+          f'{from_time} and {to_time}...')
+    with pipeline.metrics.measure('list_recordings'):
+        meetings = parse_zoom(zoom.recording.list(
+            user_id=zoom_user_id,
+            start=from_time,
+            end=to_time
+        ))['meetings']
+    meetings = sorted(meetings, key=lambda m: m['start_time'])
+    # Filter recordings less than 1 minute
+    meetings = [m for m in meetings if m['duration'] > 1]
+
+    # Recordings are only ready after the meeting is over, so it's safe to
+    # check (and cache) who attended them.
+    ready = [m for m in meetings
+             if (m['topic'] in MEETINGS_TO_RECORD or not DO_FILTER)
+             and RecordingStatus.from_meeting(m) == RecordingStatus.READY]
+    with pipeline.metrics.measure('check_participants'):
+        unattended = find_meetings_without_participants(zoom, ready, ParticipantCache(pipeline.queue.path))
+
+    for meeting in meetings:
+        print(f'Processing meeting: {meeting["topic"]} from {meeting["start_time"]} (ID: "{meeting['uuid']}")')
+
+        # 3. filter by criteria (no-op for now)
+        if meeting['topic'] not in MEETINGS_TO_RECORD and DO_FILTER:
+            print('  Skipping: meeting not in topic list.')
+            continue
+
+        status = RecordingStatus.from_meeting(meeting)
+        if status != RecordingStatus.READY:
+            print(f'  Skipping: recording is still {status.name}.')
+            continue
+
+        if meeting['uuid'] in unattended:
+            print('  Deleting recording: nobody attended this meeting.')
+            if not pipeline.dry_run:
+                added += pipeline.queue.enqueue(f'delete_meeting:{meeting["uuid"]}', 'delete_meeting',
+                                                {'meeting': meeting})
+            continue
+
+        videos = recording_videos(meeting)
+
+        if len(videos) == 0:
+            print('  🔹 Skipping: no videos for meeting')
+            continue
+        elif any((file['file_size'] == 0 for file in videos)):
+            print('  🔹 Skipping: meeting still processing')
+            continue
+
+        new_jobs = 0
+        for file in videos:
+            key = transfer_key(pipeline.services, file)
+            if pipeline.queue.get(key):
+                continue
+
+            # Only check for already published copies of files we don't
+            # know about, since it can take a lot of API calls.
+            published = index.published_services(meeting, file)
+            if published:
+                print(f'  {file["file_type"]} file {file["id"]} already published to {", ".join(published)}.')
+            if len(published) == len(pipeline.services):
+                if ZOOM_DELETE_AFTER_UPLOAD and not pipeline.dry_run:
+                    added += pipeline.queue.enqueue(f'delete:{file["id"]}', 'delete',
+                                                    delete_payload(meeting, file, pipeline.services, published))
+                continue
+
+            destinations = {service: 'done' if service in published else 'pending' for service in pipeline.services}
+            new_jobs += pipeline.queue.enqueue(key, 'transfer', {'meeting': meeting, 'file': file,
+                                                                 'destinations': destinations, 'uploads': published})
+        print(f'  {new_jobs} videos queued for upload.')
+        added += new_jobs
+
+    return added
+
+
+def report_queue(queue: JobQueue, since: float) -> int:
+    """Print a summary of the queue and return the number of new dead jobs."""
+    counts = queue.counts()
+    print('\nQueue: ' + ', '.join(f'{count} {status}' for status, count in counts.items()))
+    dead = queue.jobs(JobStatus.DEAD, since=since)
+    for job in dead:
+        print(f'  ❌ Dead job {job.key} after {job.attempts} attempts: {job.last_error}')
+    return len(dead)
+
+
+def report_time_budget(queue: JobQueue, scheduler: Scheduler, budget: float) -> None:
+    """Print the work that was left for a later run because it wouldn't fit in the time budget."""
+    left = scheduler.over_deadline(queue)
+    if not left:
+        return
+
+    size = sum(job.payload.get('file', {}).get('file_size', 0) for job in left)
+    estimate = sum(scheduler.estimate(job) for job in left)
+    print(f'\n⏱️ Out of time: {len(left)} jobs ({size / MEGABYTE:.0f} MB, ~{estimate / 60:.0f} minutes) '
+          'would not finish before the time budget ran out. They are saved in the queue for the next run.')
+    for job in left:
+        meeting = job.payload['meeting']
+        note = ' (longer than the whole time budget!)' if scheduler.estimate(job) > budget else ''
+        print(f'  {meeting["topic"]} from {meeting["start_time"]}: '
+              f'~{scheduler.estimate(job) / 60:.0f} minutes{note}')
+
+
+def report_youtube_quota(queue: JobQueue, quota: QuotaMeter) -> None:
+    """Print how much YouTube quota is left and how much the queued work needs."""
+    costs = {}
+    for job in queue.jobs(JobStatus.PENDING) + queue.jobs(JobStatus.RUNNING):
+        if job.stage != 'transfer':
+            continue
+        destinations = job.payload.get('destinations', {})
+        if destinations.get('youtube', 'pending' if 'youtube' in job.key.split(':')[1] else 'done') != 'done':
+            meeting = job.payload['meeting']
+            costs[meeting['uuid']] = youtube_upload_cost(meeting)
+
+    remaining = quota.remaining()
+    fits = 0
+    for cost in costs.values():
+        if cost > remaining:
+            break
+        remaining -= cost
+        fits += 1
+    print(f'YouTube quota: {quota.used()} of {quota.daily_limit} units used today. '
+          f'Queued uploads for {len(costs)} meetings need ~{sum(costs.values())} units '
+          f'({fits} will fit today; the rest will wait for the quota to reset).')
+
+
+def print_stats(metrics_path: str, since: datetime, period: str) -> None:
+    if not os.path.exists(metrics_path):
+        print(f'No metrics found at "{metrics_path}".')
+        return
+
+    rows = summarize(metrics_path, since=since.timestamp(), period=period)
+    print(f'Stage durations (seconds) and throughput since {since:%Y-%m-%d}:\n')
+    print(f'{"stage":<16} {"period":<10} {"count":>6} {"errors":>6} {"p50":>8} {"p95":>8} {"p99":>8} {"MB/s":>8}')
+    for row in rows:
+        percentiles = ' '.join(
+            f'{row[key]:>8.1f}' if row[key] is not None else f'{"-":>8}'
+            for key in ('p50', 'p95', 'p99')
+        )
+        throughput = f'{row["bytes_per_second"] / MEGABYTE:>8.2f}' if row['bytes_per_second'] else f'{"-":>8}'
+        print(f'{row["stage"]:<16} {row["period"]:<10} {row["count"]:>6} {row["errors"]:>6} {percentiles} {throughput}')
 
 
 def main():
     parser = ArgumentParser()
     parser.add_argument('--dry-run', action='store_true', help='Do not upload recordings.')
-    parser.add_argument('--from', type=cli_datetime,
-                        default=cli_datetime('3d'), dest='from_time',
+    parser.add_argument('--from', default='3d', dest='from_time',
                         help='Look for recordings after this date/time. '
                              'Can be an ISO date or time ("2025-01-01") or a '
                              'number of days/hours/minutes ago ("5d" = 5 days '
                              'ago) or from now ("+5d" = 5 days from now).')
-    parser.add_argument('--to', type=cli_datetime,
-                        default=cli_datetime('+1d'), dest='to_time',
+    parser.add_argument('--to', default='+1d', dest='to_time',
                         help='Look for recordings before this date/time. '
                              'Can be an ISO date or time ("2025-01-01") or a '
                              'number of days/hours/minutes ago ("5d" = 5 days '
                              'ago) or from now ("+5d" = 5 days from now).')
-    parser.add_argument('--service', choices=('gdrive', 'youtube'),
-                        default='gdrive',
-                        help='Which service to upload recordings to.')
+    parser.add_argument('--service', type=cli_services,
+                        default='gdrive', dest='services',
+                        help='Which service to upload recordings to. Use a '
+                             'comma-separated list (e.g. "gdrive,youtube") to '
+                             'upload to several services at once. Default: '
+                             'gdrive')
+    parser.add_argument('--queue', default=DEFAULT_QUEUE_FILE,
+                        help='Path to the job queue database. Work that fails '
+                             'is retried from here on later runs. Default: '
+                             f'{DEFAULT_QUEUE_FILE}')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of jobs to work on at once. Default: 1')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running, checking Zoom for new recordings '
+                             'every `--poll-interval` and processing jobs as '
+                             'soon as they are ready.')
+    parser.add_argument('--schedule', choices=[policy.value for policy in SchedulePolicy],
+                        default=SchedulePolicy.SHORTEST,
+                        help='Order to work on queued recordings in. '
+                             '"shortest" does the ones estimated to be quickest '
+                             '(based on file size and past throughput) first, '
+                             'but gives a boost to ones that have been waiting '
+                             'a long time. "oldest" goes in the order they '
+                             'were queued. Default: shortest')
+    parser.add_argument('--time-budget', type=cli_duration,
+                        help='Only start work that is estimated to finish '
+                             'within this much time (e.g. "50m") from when the '
+                             'script started. The rest is left in the queue '
+                             'for the next run.')
+    parser.add_argument('--poll-interval', type=cli_duration, default='15m',
+                        help='How often to check Zoom for new recordings in '
+                             'daemon mode, e.g. "90s", "15m", "1h". Default: 15m')
+    parser.add_argument('--process', choices=[mode.value for mode in ProcessingMode],
+                        default=ProcessingMode.NONE,
+                        help='How to process videos before uploading. "remux" '
+                             'rewrites the file so it can start playing before '
+                             'it is fully downloaded. "transcode" re-encodes '
+                             'it to make it smaller (if that is projected to '
+                             'save at least `--min-savings`) and falls back to '
+                             'remuxing otherwise. Default: none')
+    parser.add_argument('--crf', type=int, default=ProcessingOptions.crf,
+                        help='Quality to transcode at (x264 constant rate '
+                             'factor; higher is smaller and lower quality). '
+                             f'Default: {ProcessingOptions.crf}')
+    parser.add_argument('--video-bitrate', type=cli_bitrate,
+                        help='Transcode to this video bitrate (e.g. "800k") '
+                             'instead of using `--crf`.')
+    parser.add_argument('--min-savings', type=float, default=ProcessingOptions.min_savings,
+                        help='Only transcode if it is projected to save at '
+                             'least this fraction of the file size. Default: '
+                             f'{ProcessingOptions.min_savings}')
+    parser.add_argument('--trim-silence', action='store_true',
+                        help='Cut silence from the start and end of '
+                             'recordings (without re-encoding). Transcripts '
+                             'and chat logs are retimed to match.')
+    parser.add_argument('--trim-margin', type=cli_duration, default='5s',
+                        help='Seconds of silence to keep around the audible '
+                             'part of a recording when using `--trim-silence`. '
+                             'Default: 5s')
+    parser.add_argument('--youtube-quota', type=int, default=DEFAULT_DAILY_QUOTA,
+                        help='Daily YouTube API quota (in units). Uploads for '
+                             'meetings that would not fit in what is left of '
+                             "today's quota are put off until it resets. "
+                             f'Default: {DEFAULT_DAILY_QUOTA}')
+    parser.add_argument('--requeue-dead', action='store_true',
+                        help='Retry jobs that previously ran out of attempts.')
+    metrics_help = f'Path to the metrics database. Default: {DEFAULT_METRICS_FILE}'
+    parser.add_argument('--metrics', default=DEFAULT_METRICS_FILE, help=metrics_help)
+
+    commands = parser.add_subparsers(dest='command', title='commands',
+                                     description='With no command, recordings are uploaded.')
+    stats_parser = commands.add_parser('stats', help='Report how long each stage of past runs took.')
+    # Also allowed after the command. Suppressing the default keeps it from
+    # overriding a value given before the command.
+    stats_parser.add_argument('--metrics', default=SUPPRESS, help=metrics_help)
+    stats_parser.add_argument('--since', type=cli_datetime, default='90d',
+                              help='Only report on runs after this date/time '
+                                   '(same format as `--from`). Default: 90d')
+    stats_parser.add_argument('--period', choices=tuple(PERIODS.keys()), default='week',
+                              help='Time period to group results by. Default: week')
+    parser.add_argument('--profile', metavar='DIRECTORY',
+                        help='Profile the run and write a flamegraph-compatible '
+                             'collapsed stack file and a summary of the slowest '
+                             'functions, subprocesses, and HTTP requests to '
+                             'this directory.')
+    parser.add_argument('--profile-top', type=int, default=DEFAULT_TOP_COUNT,
+                        help='Number of items to list in each section of the '
+                             f'profile summary. Default: {DEFAULT_TOP_COUNT}')
     args = parser.parse_args()
-
+    if args.command == 'stats':
+        return print_stats(args.metrics, since=args.since, period=args.period)
+
+    for time_arg in ('from_time', 'to_time'):
+        try:
+            cli_datetime(getattr(args, time_arg))
+        except ValueError as error:
+            parser.error(str(error))
+
+    if not args.profile:
+        return upload_recordings(args)
+
+    profiler = Profiler()
+    profiler.start()
+    try:
+        return upload_recordings(args)
+    finally:
+        profiler.stop()
+        collapsed_path, summary_path = profiler.write(args.profile, top=args.profile_top)
+        print(f'\nWrote profile to {collapsed_path} and {summary_path}')
+        print(profiler.summary(top=10))
+
+
+def upload_recordings(args) -> None:
+    started = time.time()
     dry_run = args.dry_run or DRY_RUN
     if dry_run:
         print('⚠️ This is a dry run! Videos will not actually be uploaded.\n')
 
-    match args.service:
-        case 'gdrive':
-            upload_client = get_gdrive_client()
-            valid = validate_gdrive_credentials(upload_client)
-        case 'youtube':
-            upload_client = get_youtube_client()
-            valid = validate_youtube_credentials(upload_client)
-        case _:
-            print(f'Unknown service type: "{args.service}"')
-            return sys.exit(1)
-
-    if not valid:
-        print(f'The credentials for {args.service} were not valid!')
-        print('Please use `python scripts/auth.py` to re-authorize.')
-        return sys.exit(1)
-
-    zoom = ZoomClient(ZOOM_CLIENT_ID, ZOOM_CLIENT_SECRET, ZOOM_ACCOUNT_ID)
-
-    # Official meeting recordings we will upload belong to the account owner.
-    zoom_user_id = zoom.user.list(role_id=ZoomRole.OWNER).json()['users'][0]['id']
-
     with tempfile.TemporaryDirectory() as tmpdirname:
-        print(f'Creating tmp dir: {tmpdirname}\n')
-
-        print('Looking for videos to upload between '
-              f'{args.from_time} and {args.to_time}...')
-        meetings = parse_zoom(zoom.recording.list(
-            user_id=zoom_user_id,
-            start=args.from_time,
-            end=args.to_time
-        ))['meetings']
-        meetings = sorted(meetings, key=lambda m: m['start_time'])
-        # Filter recordings less than 1 minute
-        meetings = filter(lambda m: m['duration'] > 1, meetings)
-        for meeting in meetings:
-            print(f'Processing meeting: {meeting["topic"]} from {meeting["start_time"]} (ID: "{meeting['uuid']}")')
-
-            # 3. filter by criteria (no-op for now)
-            if meeting['topic'] not in MEETINGS_TO_RECORD and DO_FILTER:
-                print('  Skipping: meeting not in topic list.')
-                continue
-
-            status = RecordingStatus.from_meeting(meeting)
-            if status != RecordingStatus.READY:
-                print(f'  Skipping: recording is still {status.name}.')
-                continue
-
-            if meeting_had_no_participants(zoom, meeting):
-                print('  Deleting recording: nobody attended this meeting.')
-                if not dry_run:
-                    try:
-                        parse_zoom(zoom.recording.delete(
-                            meeting_id=encode_uuid(meeting['uuid']),
-                            action='trash'
-                        ))
-                        print('  🗑️ Deleted recording.')
-                    except ZoomError as error:
-                        print(f'  ❌ {error}')
-                continue
-
-            # FIXME: we now want to upload all files to gdrive
-            videos = [file for file in meeting['recording_files']
-                      if file['file_type'].lower() == 'mp4']
-
-            if len(videos) == 0:
-                print('  🔹 Skipping: no videos for meeting')
-                continue
-            elif any((file['file_size'] == 0 for file in videos)):
-                print('  🔹 Skipping: meeting still processing')
-                continue
-
-            print(f'  {len(videos)} videos to upload...')
-            for file in videos:
-                url = file['download_url']
-                print(f'    Download from {url}...')
-                filepath = download_zoom_file(zoom, url, tmpdirname)
-
-                if video_has_audio(filepath):
-                    if args.service == 'gdrive':
-                        save_to_gdrive(upload_client, meeting, filepath, dry_run, zoom, tmpdirname)
-                    elif args.service == 'youtube':
-                        save_to_youtube(upload_client, meeting, filepath, dry_run)
-                else:
-                    print('    Skipping upload: video was silent (no mics were on).')
-
-                if ZOOM_DELETE_AFTER_UPLOAD and not dry_run:
-                    try:
-                        # Just delete the video for now, since that takes the most storage space.
-                        parse_zoom(zoom.recording.delete_single_recording(
-                            meeting_id=encode_uuid(file['meeting_id']),
-                            recording_id=file['id'],
-                            action='trash'
-                        ))
-                        print(f'  🗑️ Deleted {file["file_type"]} file from Zoom for recording: {meeting["topic"]}')
-                    except ZoomError as error:
-                        print(f'  ❌ {error}')
+        # Dry runs should never leave work behind for a real run to pick up.
+        queue = JobQueue(os.path.join(tmpdirname, 'queue.sqlite3') if dry_run else args.queue)
+        # YouTube quota usage is kept with the queue, so it carries over to
+        # later runs on the same day.
+        quota = QuotaMeter(queue.path, daily_limit=args.youtube_quota) if 'youtube' in args.services else None
+
+        upload_pools = {service: get_upload_pool(service) for service in args.services}
+        for service, pool in upload_pools.items():
+            match service:
+                case 'gdrive':
+                    valid = validate_gdrive_credentials(pool.client())
+                case 'youtube':
+                    valid = validate_youtube_credentials(pool.client(), quota=quota)
+
+            if not valid:
+                print(f'The credentials for {service} were not valid!')
+                print(f'Please use `python scripts/auth.py {service}` to re-authorize.')
+                return sys.exit(1)
+
+        from zoomus import ZoomClient
+
+        zoom = ZoomClient(os.environ['EDGI_ZOOM_CLIENT_ID'],
+                          os.environ['EDGI_ZOOM_CLIENT_SECRET'],
+                          os.environ['EDGI_ZOOM_ACCOUNT_ID'])
+
+        # Official meeting recordings we will upload belong to the account owner.
+        zoom_user_id = zoom.user.list(role_id=ZoomRole.OWNER).json()['users'][0]['id']
+
+        recovered = queue.recover_interrupted()
+        if recovered:
+            print(f'Resuming {recovered} jobs that were interrupted in a previous run.')
+        if args.requeue_dead:
+            print(f'Requeued {queue.requeue_dead()} dead jobs.')
+
+        processing = ProcessingOptions(mode=ProcessingMode(args.process),
+                                       crf=args.crf,
+                                       video_bitrate=args.video_bitrate,
+                                       min_savings=args.min_savings)
+        # Dry runs don't represent real work, so don't mix their metrics in.
+        metrics = MetricsRecorder(os.path.join(tmpdirname, 'metrics.sqlite3') if dry_run else args.metrics,
+                                  services=args.services)
+        throughput = None
+        if os.path.exists(args.metrics):
+            throughput = median_throughput(args.metrics, since=(datetime.now() - timedelta(days=90)).timestamp())
+        scheduler = Scheduler(policy=SchedulePolicy(args.schedule),
+                              throughput=throughput or DEFAULT_THROUGHPUT,
+                              deadline=started + args.time_budget if args.time_budget else None)
+        pipeline = Pipeline(zoom=zoom, queue=queue, services=args.services, dry_run=dry_run,
+                            metrics=metrics,
+                            processing=processing,
+                            trim_margin=args.trim_margin if args.trim_silence else None,
+                            workers=args.workers,
+                            upload_pools=upload_pools,
+                            quota=quota)
+
+        if not args.daemon:
+            try:
+                enqueue_meetings(pipeline, zoom_user_id, cli_datetime(args.from_time), cli_datetime(args.to_time))
+                if quota:
+                    report_youtube_quota(queue, quota)
+                transfers_done = threading.Event()
+                deletions = threading.Thread(target=pipeline.run_deletions, name='deletions',
+                                             kwargs={'stop': transfers_done})
+                deletions.start()
+                try:
+                    run_workers(queue, pipeline.handlers(), workers=args.workers, policy=scheduler)
+                finally:
+                    transfers_done.set()
+                    deletions.join()
+            finally:
+                metrics.finish()
+            if args.time_budget:
+                report_time_budget(queue, scheduler, args.time_budget)
+            if report_queue(queue, since=started):
+                return sys.exit(1)
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        workers = threading.Thread(target=run_workers, name='workers',
+                                   args=(queue, pipeline.handlers()),
+                                   kwargs={'workers': args.workers, 'stop': stop, 'policy': scheduler})
+        workers.start()
+        deletions = threading.Thread(target=pipeline.run_deletions, name='deletions', kwargs={'stop': stop})
+        deletions.start()
+        try:
+            while not stop.is_set():
+                try:
+                    # Zoom's OAuth tokens are only good for an hour.
+                    zoom.refresh_token()
+                    enqueue_meetings(pipeline, zoom_user_id,
+                                     cli_datetime(args.from_time), cli_datetime(args.to_time))
+                    if quota:
+                        report_youtube_quota(queue, quota)
+                except Exception as error:
+                    print(f'❌ Error checking Zoom for recordings: {error}')
+                report_queue(queue, since=started)
+                started = time.time()
+                time_left = scheduler.time_left()
+                if time_left is not None and time_left <= 0:
+                    print('Time budget used up; stopping after current jobs finish...')
+                    stop.set()
+                stop.wait(min(args.poll_interval, time_left) if time_left is not None else args.poll_interval)
+        except KeyboardInterrupt:
+            print('Stopping after current jobs finish...')
+            stop.set()
+        workers.join()
+        deletions.join()
+        metrics.finish()
+        if args.time_budget:
+            report_time_budget(queue, scheduler, args.time_budget)
 
 
 if __name__ == '__main__':